@@ -0,0 +1,438 @@
+import argparse
+import json
+import multiprocessing
+import shutil
+import subprocess
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import faiss
+import numpy as np
+
+from src.answer import load_meta, search_batch
+from src.artifacts import current_build_id, resolve_index_dir
+from src.config import get_repo_root, load_config
+from src.index import REDUCE_METHODS, build_index, load_chunks
+from src.ingest import ingest_raw_texts
+from src.late_interaction import load_token_store
+from src.semantic_cache import SemanticCache
+
+
+WORDS = [
+    "audit", "citation", "evidence", "retrieval", "index", "chunk", "vector", "query",
+    "answer", "report", "metric", "corpus", "source", "policy", "reliable", "measure",
+    "baseline", "regression", "document", "search", "embedding", "faithful", "quote", "score",
+    "latency", "throughput", "memory", "storage", "config", "sample", "project", "review",
+]
+
+
+class SyntheticEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer.encode().
+
+    Each text maps to a fixed random unit vector (seeded by crc32), so benchmarks
+    measure index/search cost without paying for a real model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dim, dtype=np.float32)
+
+    def encode(
+        self,
+        texts: List[str],
+        normalize_embeddings: bool = True,
+        batch_size: int = 32,
+        output_value: Optional[str] = None,
+    ):
+        if output_value == "token_embeddings":
+            # One vector per whitespace token (seeded by the token), as src.late_interaction expects.
+            return [np.stack([self._vector(w) for w in (t.split() or [""])]) for t in texts]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            out[i] = self._vector(t)
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out
+
+
+def load_encoder(kind: str, model_name: str, dim: int):
+    if kind == "synthetic":
+        return SyntheticEncoder(dim)
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def make_doc(rng: np.random.Generator, n_chars: int) -> str:
+    words = []
+    size = -1  # no separator before the first word
+    while size < n_chars:
+        w = WORDS[int(rng.integers(len(WORDS)))]
+        words.append(w)
+        size += len(w) + 1
+    return " ".join(words)
+
+
+def write_synthetic_corpus(
+    raw_dir: Path,
+    n_chunks: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunks_per_doc: int = 50,
+    seed: int = 0,
+) -> int:
+    """
+    Writes enough synthetic .txt files into raw_dir for ingest to yield ~n_chunks chunks.
+    Returns the number of documents written.
+    """
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    for old in raw_dir.glob("*.txt"):
+        old.unlink()
+
+    step = max(1, chunk_size - chunk_overlap)
+    rng = np.random.default_rng(seed)
+
+    n_docs = 0
+    remaining = n_chunks
+    while remaining > 0:
+        k = min(chunks_per_doc, remaining)
+        # chunk_text emits ceil(len / step) chunks; aim just under k * step characters.
+        text = make_doc(rng, (k - 1) * step + 1)
+        (raw_dir / f"synthetic_{n_docs:07d}.txt").write_text(text, encoding="utf-8")
+        remaining -= k
+        n_docs += 1
+    return n_docs
+
+
+def iter_text_batches(chunks_path: Path, batch_size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    with chunks_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(json.loads(line)["text"])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def sample_questions(chunks_path: Path, n: int, max_chars: int = 120) -> List[str]:
+    questions = []
+    for batch in iter_text_batches(chunks_path, batch_size=max(1, n)):
+        for t in batch:
+            questions.append(t[:max_chars])
+            if len(questions) >= n:
+                return questions
+    return questions
+
+
+def percentile_ms(seconds: List[float], q: float) -> float:
+    if not seconds:
+        return 0.0
+    return float(np.percentile(np.asarray(seconds, dtype=np.float64), q) * 1000.0)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Process-lifetime peak RSS (run_isolated() gives each run its own process).
+    None where the resource module is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    if sys.platform == "darwin":
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+
+def dir_size_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def load_query_artifacts(index_root: Path, encoder_kind: str, model_name: str, dim: int, late: bool):
+    """Resolves CURRENT and loads what a query needs, as src.answer does: (index_dir, index, meta, token_store, encoder)."""
+    index_dir = resolve_index_dir(index_root)
+    meta = load_meta(index_dir / "meta.jsonl")
+    index = faiss.read_index(str(index_dir / "faiss.index"))
+    token_store = load_token_store(index_dir) if late else None
+    encoder = load_encoder(encoder_kind, model_name, dim)
+    return index_dir, index, meta, token_store, encoder
+
+
+def time_cold_start(index_root: Path, encoder_kind: str, model_name: str, dim: int, late: bool) -> float:
+    """
+    Wall time for a fresh interpreter to import the query path and run load_query_artifacts().
+    The OS file cache is still warm from the build, so disk reads are not included.
+    """
+    args = json.dumps([str(index_root), encoder_kind, model_name, dim, late])
+    code = (
+        "import json, sys; from pathlib import Path; from eval.bench import load_query_artifacts; "
+        "a = json.loads(sys.argv[1]); load_query_artifacts(Path(a[0]), *a[1:])"
+    )
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code, args], cwd=str(get_repo_root()), check=True)
+    return time.perf_counter() - t0
+
+
+def run_one(
+    work_dir: Path,
+    n_chunks: int,
+    encoder_kind: str,
+    model_name: str,
+    dim: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    n_queries: int,
+    top_k: int,
+    batch_size: int,
+    retrieval: str = "single",
+    candidates: int = 50,
+    n_centroids: int = 4096,
+    reduce_dim: Optional[int] = None,
+    reduce_method: str = "pca",
+    cache_threshold: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    One benchmark run through the same code the CLIs use: src.ingest, src.index.build_index
+    (checkpointed embedding, builds/ + CURRENT publish) and src.answer.search_batch
+    (late-interaction rerank and semantic cache included when enabled).
+    """
+    raw_dir = work_dir / "raw"
+    chunks_path = work_dir / "chunks.jsonl"
+    index_root = work_dir / "index"
+    late = retrieval == "late"
+
+    write_synthetic_corpus(raw_dir, n_chunks, chunk_size, chunk_overlap)
+    # Every run builds from scratch, never from a previous run's checkpoint or build.
+    shutil.rmtree(index_root, ignore_errors=True)
+
+    # ingest
+    t0 = time.perf_counter()
+    total_chunks = ingest_raw_texts(raw_dir, chunks_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    ingest_s = time.perf_counter() - t0
+
+    # index build (load chunks + embed + add + write + publish)
+    encoder = load_encoder(encoder_kind, model_name, dim)
+    t0 = time.perf_counter()
+    chunks = load_chunks(chunks_path)
+    build_index(
+        encoder,
+        model_name,
+        chunks_path,
+        chunks,
+        index_root,
+        batch_size=batch_size,
+        late_interaction=late,
+        n_centroids=n_centroids,
+        reduce_dim=reduce_dim,
+        reduce_method=reduce_method,
+    )
+    build_s = time.perf_counter() - t0
+    del chunks
+
+    # cold start (fresh process: imports + resolve CURRENT + load artifacts + encoder)
+    cold_start_s = time_cold_start(index_root, encoder_kind, model_name, dim, late)
+    index_dir, index, meta, token_store, encoder = load_query_artifacts(index_root, encoder_kind, model_name, dim, late)
+
+    questions = sample_questions(chunks_path, n_queries)
+
+    def new_cache() -> Optional[SemanticCache]:
+        if cache_threshold is None:
+            return None
+        return SemanticCache(index.d, threshold=cache_threshold, build_id=current_build_id(index_root))
+
+    def search(batch: List[str], cache: Optional[SemanticCache]) -> None:
+        search_batch(encoder, index, meta, batch, top_k, token_store=token_store, candidates=candidates, cache=cache)
+
+    # single-query latency (encode + search [+ rerank] [+ cache])
+    cache = new_cache()
+    latencies: List[float] = []
+    for q in questions:
+        t0 = time.perf_counter()
+        search([q], cache)
+        latencies.append(time.perf_counter() - t0)
+    cache_hit_rate = cache.stats()["hit_rate"] if cache is not None else None
+
+    # batched throughput (fresh cache, so it isn't warmed by the single-query pass)
+    cache = new_cache()
+    t0 = time.perf_counter()
+    for start in range(0, len(questions), batch_size):
+        search(questions[start : start + batch_size], cache)
+    batch_s = time.perf_counter() - t0
+
+    return {
+        "n_chunks": total_chunks,
+        "ingest_s": ingest_s,
+        "ingest_chunks_per_s": (total_chunks / ingest_s) if ingest_s > 0 else 0.0,
+        "index_build_s": build_s,
+        "index_size_bytes": (index_dir / "faiss.index").stat().st_size,
+        "build_size_bytes": dir_size_bytes(index_dir),
+        "cold_start_s": cold_start_s,
+        "query_n": len(latencies),
+        "query_p50_ms": percentile_ms(latencies, 50),
+        "query_p99_ms": percentile_ms(latencies, 99),
+        "batch_qps": (len(questions) / batch_s) if batch_s > 0 else 0.0,
+        "cache_hit_rate": cache_hit_rate,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(**kwargs: Any) -> Dict[str, Any]:
+    """run_one() in a fresh process, so peak_rss_mb is that run's own peak rather than the largest run so far."""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_one, kwds=kwargs)
+
+
+def write_json(path: Path, payload: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmark (ingest, index build, cold start, query latency).")
+    parser.add_argument("--config", type=str, default=None, help="Path to config YAML (optional).")
+    parser.add_argument("--sizes", type=str, default="10000", help="Comma-separated corpus sizes in chunks, e.g. 10000,100000.")
+    parser.add_argument(
+        "--encoder",
+        type=str,
+        choices=["synthetic", "model"],
+        default="synthetic",
+        help="synthetic = hash-seeded vectors (measures index/search only); model = configured SentenceTransformer.",
+    )
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension for the synthetic encoder.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per run for latency/throughput.")
+    parser.add_argument("--top_k", type=int, default=5, help="k for search.")
+    parser.add_argument("--batch_size", type=int, default=64, help="Encoder batch size (index build and batched queries).")
+    parser.add_argument(
+        "--retrieval",
+        type=str,
+        choices=["single", "late"],
+        default="single",
+        help="late = build with --late_interaction and rerank queries by MaxSim.",
+    )
+    parser.add_argument("--candidates", type=int, default=50, help="First-stage candidates for --retrieval late.")
+    parser.add_argument("--n_centroids", type=int, default=4096, help="Token compressor centroids for --retrieval late.")
+    parser.add_argument("--reduce_dim", type=int, default=None, help="Build with src.index --reduce_dim.")
+    parser.add_argument("--reduce_method", type=str, choices=list(REDUCE_METHODS), default="pca", help="pca or truncate.")
+    parser.add_argument(
+        "--cache_threshold",
+        type=float,
+        default=None,
+        help="Query through the semantic cache at this similarity threshold.",
+    )
+    parser.add_argument("--work_dir", type=str, default="outputs/bench", help="Scratch directory for generated artifacts (local).")
+    parser.add_argument("--out", type=str, default="outputs/bench_run.json", help="Path to write JSON report (local).")
+    args = parser.parse_args()
+
+    cfg = load_config(args.config)
+    repo_root = get_repo_root()
+
+    retrieval_cfg = cfg.get("retrieval", {})
+    model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+    chunk_size = int(retrieval_cfg.get("chunk_size", 800))
+    chunk_overlap = int(retrieval_cfg.get("chunk_overlap", 120))
+
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s.strip())
+
+    if args.reduce_dim and args.reduce_method == "pca" and sizes and sizes[0] < args.reduce_dim:
+        print(f"PCA to {args.reduce_dim} dims needs at least {args.reduce_dim} chunks; smallest size is {sizes[0]}.")
+        return
+
+    work_dir = Path(args.work_dir)
+    if not work_dir.is_absolute():
+        work_dir = repo_root / work_dir
+    out_path = Path(args.out)
+    if not out_path.is_absolute():
+        out_path = repo_root / out_path
+
+    print(f"Config: {args.config or '(auto)'}")
+    print(f"Encoder: {args.encoder}" + (f" ({model_name})" if args.encoder == "model" else f" (dim={args.dim})"))
+    print(f"Sizes: {sizes}")
+    print(
+        f"Retrieval: {args.retrieval}"
+        + (f" (candidates={args.candidates})" if args.retrieval == "late" else "")
+        + (f"  reduce_dim={args.reduce_dim} ({args.reduce_method})" if args.reduce_dim else "")
+        + (f"  cache_threshold={args.cache_threshold}" if args.cache_threshold is not None else "")
+    )
+    print(f"Work dir: {work_dir}")
+    print("-" * 72)
+
+    runs = []
+    for n in sizes:
+        run = run_isolated(
+            work_dir=work_dir / f"n{n}",
+            n_chunks=n,
+            encoder_kind=args.encoder,
+            model_name=model_name,
+            dim=args.dim,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            n_queries=args.queries,
+            top_k=args.top_k,
+            batch_size=args.batch_size,
+            retrieval=args.retrieval,
+            candidates=args.candidates,
+            n_centroids=args.n_centroids,
+            reduce_dim=args.reduce_dim,
+            reduce_method=args.reduce_method,
+            cache_threshold=args.cache_threshold,
+        )
+        runs.append(run)
+
+        rss = run["peak_rss_mb"]
+        print(f"n_chunks={run['n_chunks']}")
+        print(f"  ingest:      {run['ingest_chunks_per_s']:.0f} chunks/s")
+        print(
+            f"  index build: {run['index_build_s']:.2f}s  size={run['index_size_bytes'] / (1024 * 1024):.1f} MiB  "
+            f"(build dir {run['build_size_bytes'] / (1024 * 1024):.1f} MiB)"
+        )
+        print(f"  cold start:  {run['cold_start_s']:.2f}s")
+        print(f"  query:       p50={run['query_p50_ms']:.2f}ms  p99={run['query_p99_ms']:.2f}ms  (n={run['query_n']})")
+        print(f"  batched:     {run['batch_qps']:.1f} queries/s  (batch_size={args.batch_size})")
+        if run["cache_hit_rate"] is not None:
+            print(f"  cache:       hit_rate={run['cache_hit_rate']:.3f}  (threshold={args.cache_threshold})")
+        print(f"  peak RSS:    {'n/a' if rss is None else f'{rss:.0f} MiB'}")
+
+    payload = {
+        "summary": {
+            "encoder": args.encoder,
+            "embedding_model": model_name if args.encoder == "model" else None,
+            "dim": args.dim if args.encoder == "synthetic" else None,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "top_k": args.top_k,
+            "queries": args.queries,
+            "batch_size": args.batch_size,
+            "retrieval": args.retrieval,
+            "candidates": args.candidates if args.retrieval == "late" else None,
+            "reduce_dim": args.reduce_dim,
+            "reduce_method": args.reduce_method if args.reduce_dim else None,
+            "cache_threshold": args.cache_threshold,
+            "sizes": sizes,
+        },
+        "runs": runs,
+    }
+    write_json(out_path, payload)
+    print("-" * 72)
+    print(f"Wrote JSON results to: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
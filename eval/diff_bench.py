@@ -0,0 +1,146 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# metric -> direction ("lower" means lower is better)
+METRICS: List[Tuple[str, str]] = [
+    ("ingest_chunks_per_s", "higher"),
+    ("index_build_s", "lower"),
+    ("index_size_bytes", "lower"),
+    ("build_size_bytes", "lower"),
+    ("cold_start_s", "lower"),
+    ("query_p50_ms", "lower"),
+    ("query_p99_ms", "lower"),
+    ("batch_qps", "higher"),
+    ("peak_rss_mb", "lower"),
+]
+
+# Run settings that change what is measured; a diff across them is flagged.
+CONFIG_KEYS = ["encoder", "embedding_model", "dim", "retrieval", "candidates", "reduce_dim", "reduce_method", "cache_threshold"]
+
+
+def load_json(path: Path) -> Dict[str, Any]:
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_by_size(runs: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    out = {}
+    for run in runs:
+        n = run.get("n_chunks")
+        if n is not None:
+            out[int(n)] = run
+    return out
+
+
+def parse_thresholds(specs: List[str], default: float) -> Dict[str, float]:
+    """
+    Per-metric relative tolerances, e.g. ["query_p99_ms=0.25"].
+    Metrics not listed use the default tolerance.
+    """
+    known = {name for name, _ in METRICS}
+    out = {name: default for name in known}
+    for spec in specs:
+        name, _, value = spec.partition("=")
+        name = name.strip()
+        if name not in known or not value:
+            raise ValueError(f"Bad --threshold '{spec}'. Expected <metric>=<fraction>, metric one of: {sorted(known)}")
+        out[name] = float(value)
+    return out
+
+
+def relative_change(before: float, after: float, direction: str) -> float:
+    """
+    Signed relative change where positive means worse.
+    """
+    if before == 0:
+        return 0.0
+    delta = (after - before) / abs(before)
+    return delta if direction == "lower" else -delta
+
+
+def compare_runs(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    thresholds: Dict[str, float],
+) -> List[Dict[str, Any]]:
+    rows = []
+    for name, direction in METRICS:
+        b: Optional[float] = baseline.get(name)
+        a: Optional[float] = current.get(name)
+        if b is None or a is None:
+            continue
+        worse_by = relative_change(float(b), float(a), direction)
+        rows.append(
+            {
+                "metric": name,
+                "before": float(b),
+                "after": float(a),
+                "worse_by": worse_by,
+                "regression": worse_by > thresholds[name],
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two bench_run.json reports and flag performance regressions.")
+    parser.add_argument("--baseline", type=str, required=True, help="Path to stored baseline bench_run.json")
+    parser.add_argument("--current", type=str, required=True, help="Path to new bench_run.json")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Default allowed relative slowdown (0.10 = 10%%).")
+    parser.add_argument(
+        "--threshold",
+        action="append",
+        default=[],
+        help="Per-metric tolerance override, e.g. --threshold query_p99_ms=0.25 (repeatable).",
+    )
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline).expanduser().resolve()
+    current_path = Path(args.current).expanduser().resolve()
+
+    thresholds = parse_thresholds(args.threshold, args.tolerance)
+    baseline_report = load_json(baseline_path)
+    current_report = load_json(current_path)
+    baseline = index_by_size(baseline_report.get("runs", []))
+    current = index_by_size(current_report.get("runs", []))
+
+    print("BENCH DIFF")
+    print(f"baseline: {baseline_path}")
+    print(f"current : {current_path}")
+    for key in CONFIG_KEYS:
+        b_cfg = baseline_report.get("summary", {}).get(key)
+        a_cfg = current_report.get("summary", {}).get(key)
+        if b_cfg != a_cfg:
+            print(f"WARNING: {key} differs ({b_cfg} -> {a_cfg}); timings are not like-for-like.")
+
+    regressions = 0
+    for n in sorted(set(baseline.keys()) | set(current.keys())):
+        print("-" * 72)
+        if n not in baseline:
+            print(f"n_chunks={n}: ADDED (no baseline)")
+            continue
+        if n not in current:
+            print(f"n_chunks={n}: REMOVED (not in current run)")
+            continue
+
+        print(f"n_chunks={n}")
+        for row in compare_runs(baseline[n], current[n], thresholds):
+            flag = "REGRESSION" if row["regression"] else "ok"
+            print(
+                f"  {row['metric']:<20} {row['before']:.4g}  ->  {row['after']:.4g}   "
+                f"(worse_by={row['worse_by']:+.1%}, tol={thresholds[row['metric']]:.0%})  {flag}"
+            )
+            regressions += 1 if row["regression"] else 0
+
+    print("-" * 72)
+    if regressions:
+        print(f"Performance regressions: {regressions}")
+        raise SystemExit(1)
+    print("No performance regressions detected.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
 import argparse
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List
+
+from eval.report_io import (
+    build_summary,
+    is_jsonl_report,
+    iter_examples,
+    iter_sorted_examples,
+    merge_join,
+    new_totals,
+    read_summary,
+    tally,
+)
 
 
 def load_json(path: Path) -> Dict[str, Any]:
@@ -22,27 +33,60 @@ def index_by_id(examples: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
     return out
 
 
+def rebuild_summary(path: Path) -> Dict[str, Any]:
+    """Recomputes summary metrics from the example records of a JSONL report."""
+    totals = new_totals()
+    for rec in iter_examples(path):
+        tally(totals, rec)
+    return build_summary(totals, top_k=None, model_name=None, eval_path=None)
+
+
+def load_report(path: Path) -> Dict[str, Any]:
+    """
+    Returns {"summary": ..., "examples": <id-sorted iterator>} for either report format.
+    JSONL reports are streamed; legacy eval_run.json files are loaded whole.
+    """
+    if is_jsonl_report(path):
+        summary = read_summary(path)
+        if not summary:
+            summary = rebuild_summary(path)
+            print(
+                f"WARNING: {path} has no summary record (run unfinished or crashed); "
+                f"summary rebuilt from its {summary['total']} example records."
+            )
+        return {"summary": summary, "examples": iter_sorted_examples(path)}
+
+    report = load_json(path)
+    by_id = index_by_id(report.get("examples", []))
+    examples: Iterator[Dict[str, Any]] = (by_id[k] for k in sorted(by_id))
+    return {"summary": report.get("summary", {}), "examples": examples}
+
+
 def summarize(summary: Dict[str, Any]) -> Dict[str, float]:
     hit = summary.get("hit_at_k", {}).get("value", 0.0)
     grounded = summary.get("grounded_at_k", {}).get("value", 0.0)
     correct = summary.get("correct_citations_at_k", {}).get("value", 0.0)
-    return {"hit": float(hit), "grounded": float(grounded), "correct_citations": float(correct)}
+    out = {"hit": float(hit), "grounded": float(grounded), "correct_citations": float(correct)}
+    if "latency_ms" in summary:
+        out["latency_p50_ms"] = float(summary["latency_ms"].get("p50", 0.0))
+        out["latency_p99_ms"] = float(summary["latency_ms"].get("p99", 0.0))
+    return out
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Diff two eval_run.json reports (regressions).")
-    parser.add_argument("--before", type=str, required=True, help="Path to older eval_run.json")
-    parser.add_argument("--after", type=str, required=True, help="Path to newer eval_run.json")
+    parser = argparse.ArgumentParser(description="Diff two eval reports (eval_run.json or eval_run.jsonl) for regressions.")
+    parser.add_argument("--before", type=str, required=True, help="Path to older eval report")
+    parser.add_argument("--after", type=str, required=True, help="Path to newer eval report")
     args = parser.parse_args()
 
     before_path = Path(args.before).expanduser().resolve()
     after_path = Path(args.after).expanduser().resolve()
 
-    before = load_json(before_path)
-    after = load_json(after_path)
+    before = load_report(before_path)
+    after = load_report(after_path)
 
-    bsum = summarize(before.get("summary", {}))
-    asum = summarize(after.get("summary", {}))
+    bsum = summarize(before["summary"])
+    asum = summarize(after["summary"])
 
     print("EVAL SUMMARY DIFF")
     print(f"before: {before_path}")
@@ -51,43 +95,35 @@ def main():
     print(f"hit@k             {pct(bsum['hit'])}  ->  {pct(asum['hit'])}   (delta={pct(asum['hit'] - bsum['hit'])})")
     print(f"grounded@k        {pct(bsum['grounded'])}  ->  {pct(asum['grounded'])}   (delta={pct(asum['grounded'] - bsum['grounded'])})")
     print(f"correct_citations {pct(bsum['correct_citations'])}  ->  {pct(asum['correct_citations'])}   (delta={pct(asum['correct_citations'] - bsum['correct_citations'])})")
+    if "latency_p50_ms" in bsum and "latency_p50_ms" in asum:
+        for key, label in (("latency_p50_ms", "latency p50 (ms)"), ("latency_p99_ms", "latency p99 (ms)")):
+            print(f"{label:<17} {bsum[key]:.2f}  ->  {asum[key]:.2f}   (delta={asum[key] - bsum[key]:+.2f})")
     print("-" * 72)
 
-    b_examples = index_by_id(before.get("examples", []))
-    a_examples = index_by_id(after.get("examples", []))
-
-    all_ids = sorted(set(b_examples.keys()) | set(a_examples.keys()))
-    changes: List[Tuple[str, str]] = []
-
     def status_str(ex: Dict[str, Any]) -> str:
         h = ex.get("hit_at_k", None)
         g = ex.get("grounded_at_k", None)
         c = ex.get("correct_citations_at_k", None)
         return f"hit={h} grounded={g} correct_citations={c}"
 
-    for ex_id in all_ids:
-        b = b_examples.get(ex_id)
-        a = a_examples.get(ex_id)
+    # Streaming merge-join: changes are printed as found, nothing is accumulated.
+    changes = 0
+    for ex_id, b, a in merge_join(before["examples"], after["examples"]):
         if b is None:
-            changes.append((ex_id, "ADDED"))
+            kind = "ADDED"
+        elif a is None:
+            kind = "REMOVED"
+        elif status_str(b) != status_str(a):
+            kind = "CHANGED"
+        else:
             continue
-        if a is None:
-            changes.append((ex_id, "REMOVED"))
-            continue
-
-        if status_str(b) != status_str(a):
-            changes.append((ex_id, "CHANGED"))
 
-    if not changes:
-        print("No per-example status changes detected.")
-        return
+        if changes == 0:
+            print("PER-EXAMPLE CHANGES")
+        changes += 1
 
-    print("PER-EXAMPLE CHANGES")
-    for ex_id, kind in changes:
         print("-" * 72)
         print(f"{kind}: {ex_id}")
-        b = b_examples.get(ex_id)
-        a = a_examples.get(ex_id)
 
         if kind == "ADDED":
             print(f"question: {a.get('question')}")
@@ -110,8 +146,12 @@ def main():
         print(f"answer_citations(before)   : {b.get('answer_citations')}")
         print(f"answer_citations(after)    : {a.get('answer_citations')}")
 
+    if not changes:
+        print("No per-example status changes detected.")
+        return
+
     print("-" * 72)
-    print(f"Total changes: {len(changes)}")
+    print(f"Total changes: {changes}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,192 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from src.answer import load_meta, search_batch_ids
+from src.artifacts import resolve_index_dir
+from src.config import get_repo_root, load_config
+from src.index import base_index_dim, make_index
+from eval.report_io import iter_jsonl, latency_summary
+
+
+def chunk_embeddings(
+    index: faiss.Index,
+    meta: List[Dict[str, Any]],
+    model: SentenceTransformer,
+    batch_size: int,
+) -> np.ndarray:
+    """
+    Full-dimension chunk vectors for the current build: read back from a flat index,
+    or re-encoded from meta.jsonl if the build itself was reduced.
+    """
+    if not isinstance(index, faiss.IndexPreTransform):
+        return index.reconstruct_n(0, index.ntotal)
+    texts = [row.get("text", "") for row in meta]
+    return np.asarray(model.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+
+
+def citation_of(row: Dict[str, Any], idx: int) -> str:
+    return f"{row.get('source_file', 'unknown')}#{row.get('chunk_id', f'row_{idx}')}"
+
+
+def evaluate_index(
+    index: faiss.Index,
+    meta: List[Dict[str, Any]],
+    q_emb: np.ndarray,
+    expected: List[List[str]],
+    top_k: int,
+) -> Dict[str, Any]:
+    """Index size, single-query search latency (embedding excluded) and hit@k for one index variant."""
+    latencies: List[float] = []
+    hits = 0
+    scored = 0
+    for b in range(q_emb.shape[0]):
+        t0 = time.perf_counter()
+        results = search_batch_ids(index, meta, q_emb[b : b + 1], top_k)[0]
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        if not expected[b]:
+            continue
+        scored += 1
+        retrieved = [citation_of(row, idx) for idx, _, row in results]
+        hits += 1 if any(e in retrieved for e in expected[b]) else 0
+
+    return {
+        "index_size_bytes": int(faiss.serialize_index(index).nbytes),
+        "search_latency_ms": latency_summary(latencies),
+        "hit_at_k": {"value": (hits / scored) if scored else 0.0, "hits": hits, "scored_total": scored},
+    }
+
+
+def sweep_dims(
+    chunk_emb: np.ndarray,
+    meta: List[Dict[str, Any]],
+    q_emb: np.ndarray,
+    expected: List[List[str]],
+    dims: List[int],
+    methods: List[str],
+    top_k: int,
+    max_train: int = 100_000,
+) -> List[Dict[str, Any]]:
+    """
+    Builds one in-memory index per (dim, method), plus the full-dimension baseline,
+    and evaluates each on the same question embeddings.
+    """
+    full_dim = chunk_emb.shape[1]
+    stride = max(1, chunk_emb.shape[0] // max_train)
+
+    variants: List[Dict[str, Any]] = [{"dim": full_dim, "method": None}]
+    for d in sorted({d for d in dims if 0 < d < full_dim}, reverse=True):
+        variants.extend({"dim": d, "method": m} for m in methods)
+
+    runs = []
+    for v in variants:
+        if v["method"] == "pca" and chunk_emb.shape[0] < v["dim"]:
+            runs.append({**v, "skipped": f"PCA needs at least {v['dim']} chunks"})
+            continue
+        t0 = time.perf_counter()
+        index = make_index(full_dim, v["dim"], v["method"] or "pca")
+        if not index.is_trained:
+            index.train(chunk_emb[::stride])
+        index.add(chunk_emb)
+        build_s = time.perf_counter() - t0
+        runs.append({**v, "index_build_s": build_s, **evaluate_index(index, meta, q_emb, expected, top_k)})
+    return runs
+
+
+def write_json(path: Path, payload: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index size / search latency / hit@k across reduced embedding dimensions (src.index --reduce_dim)."
+    )
+    parser.add_argument("--config", type=str, default=None, help="Path to config YAML (optional).")
+    parser.add_argument("--dims", type=str, default="256,128,64,32", help="Comma-separated target dimensions.")
+    parser.add_argument("--methods", type=str, default="pca,truncate", help="Comma-separated: pca, truncate.")
+    parser.add_argument("--top_k", type=int, default=5, help="k for hit@k.")
+    parser.add_argument("--batch_size", type=int, default=64, help="Encoder batch size.")
+    parser.add_argument("--out", type=str, default="outputs/dim_sweep.json", help="Path to write JSON report (local).")
+    args = parser.parse_args()
+
+    cfg = load_config(args.config)
+    repo_root = get_repo_root()
+
+    retrieval_cfg = cfg.get("retrieval", {})
+    model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+
+    index_dir = resolve_index_dir(repo_root / "data" / "index")
+    index_path = index_dir / "faiss.index"
+    meta_path = index_dir / "meta.jsonl"
+    eval_path = repo_root / "eval" / "eval_set.jsonl"
+
+    if not index_path.exists() or not meta_path.exists():
+        print("Missing index artifacts. Run:")
+        print("  python -m src.ingest")
+        print("  python -m src.index")
+        return
+
+    dims = [int(d) for d in args.dims.split(",") if d.strip()]
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+
+    index = faiss.read_index(str(index_path))
+    meta = load_meta(meta_path)
+    model = SentenceTransformer(model_name)
+
+    examples = [ex for ex in iter_jsonl(eval_path) if ex.get("question", "").strip()]
+    questions = [ex["question"].strip() for ex in examples]
+    expected = [ex.get("expected_citations", []) for ex in examples]
+
+    chunk_emb = chunk_embeddings(index, meta, model, args.batch_size)
+    q_emb = np.asarray(model.encode(questions, batch_size=args.batch_size, normalize_embeddings=True), dtype=np.float32)
+
+    print(f"Config: {args.config or '(auto)'}")
+    print(f"Embedding model: {model_name} (dim={chunk_emb.shape[1]}, current build stores {base_index_dim(index)})")
+    print(f"Chunks: {chunk_emb.shape[0]}  Eval set: {eval_path} ({len(questions)} questions)")
+    print("-" * 72)
+
+    runs = sweep_dims(chunk_emb, meta, q_emb, expected, dims, methods, args.top_k)
+    for run in runs:
+        label = f"dim={run['dim']:<4} {run['method'] or 'full':<8}"
+        if "skipped" in run:
+            print(f"{label} skipped: {run['skipped']}")
+            continue
+        lat = run["search_latency_ms"]
+        hit = run["hit_at_k"]
+        print(
+            f"{label} size={run['index_size_bytes'] / 1024:.1f} KiB  "
+            f"search p50={lat['p50']:.3f}ms p99={lat['p99']:.3f}ms  "
+            f"hit@{args.top_k}={hit['value']:.3f} ({hit['hits']}/{hit['scored_total']})"
+        )
+
+    out_path = Path(args.out)
+    if not out_path.is_absolute():
+        out_path = repo_root / out_path
+    payload = {
+        "summary": {
+            "embedding_model": model_name,
+            "full_dim": int(chunk_emb.shape[1]),
+            "n_chunks": int(chunk_emb.shape[0]),
+            "eval_set_path": str(eval_path),
+            "questions": len(questions),
+            "top_k": args.top_k,
+            "dims": dims,
+            "methods": methods,
+        },
+        "runs": runs,
+    }
+    write_json(out_path, payload)
+    print("-" * 72)
+    print(f"Wrote JSON results to: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
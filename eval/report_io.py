@@ -0,0 +1,402 @@
+import heapq
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+# JSONL reports start with a {"type": "settings", "settings": {...}} record (the run
+# options that must match for --resume), then hold one {"type": "example", ...} record
+# per line, written as the run progresses, followed by a single trailing
+# {"type": "summary", ...} record.
+SETTINGS = "settings"
+EXAMPLE = "example"
+SUMMARY = "summary"
+
+
+def is_jsonl_report(path: Path) -> bool:
+    return path.suffix.lower() == ".jsonl"
+
+
+def iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)
+
+
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Like iter_jsonl(), but stops at a torn last line left by a crashed writer."""
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            torn = not line.endswith("\n")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if torn:
+                    return
+                raise
+
+
+def iter_examples(path: Path) -> Iterator[Dict[str, Any]]:
+    for rec in iter_records(path):
+        if rec.get("type", EXAMPLE) == EXAMPLE:
+            yield rec
+
+
+def read_summary(path: Path) -> Dict[str, Any]:
+    """Returns the trailing summary record, or {} if the run never finished."""
+    summary: Dict[str, Any] = {}
+    for rec in iter_records(path):
+        if rec.get("type") == SUMMARY:
+            summary = rec
+    return summary
+
+
+def append_record(f, record: Dict[str, Any]) -> None:
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+
+
+def prepare_resume(
+    path: Path, settings: Optional[Dict[str, Any]] = None
+) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Makes an interrupted JSONL report safe to append to.
+
+    Reads the run settings (from the settings record, or a summary's "settings"),
+    drops a torn last line (crash mid-write) and any summary record, and returns
+    (example records kept, settings or None). A missing report is (0, None).
+    If settings is given and the report was written with different ones, raises
+    ValueError and leaves the file untouched.
+    Records are written in eval-set order, so callers resume by position (see
+    skip_done()) and replay iter_examples(path) to rebuild their running totals.
+    """
+    if not path.exists():
+        return 0, None
+
+    keep_bytes = 0
+    n_done = 0
+    prev_settings: Optional[Dict[str, Any]] = None
+    with path.open("rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            line = raw.strip()
+            if line:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                kind = rec.get("type", EXAMPLE)
+                if kind == SUMMARY:
+                    prev_settings = rec.get("settings", prev_settings)
+                    break
+                if kind == SETTINGS:
+                    prev_settings = rec.get("settings")
+                elif kind == EXAMPLE:
+                    n_done += 1
+            keep_bytes += len(raw)
+
+    if settings is not None and prev_settings is not None and prev_settings != settings:
+        diffs = "; ".join(settings_mismatch(prev_settings, settings))
+        raise ValueError(f"{path} was written with different settings ({diffs})")
+
+    with path.open("r+b") as f:
+        f.truncate(keep_bytes)
+    return n_done, prev_settings
+
+
+def settings_mismatch(before: Dict[str, Any], after: Dict[str, Any]) -> List[str]:
+    """Human-readable differences between two settings dicts, e.g. ["retrieval: single -> late"]."""
+    return [f"{k}: {before.get(k)} -> {after.get(k)}" for k in sorted(set(before) | set(after)) if before.get(k) != after.get(k)]
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {"p50": 0.0, "p99": 0.0, "mean": 0.0}
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    return {"p50": float(np.percentile(arr, 50)), "p99": float(np.percentile(arr, 99)), "mean": float(arr.mean())}
+
+
+# Log-spaced latency buckets from 1 µs to 100 s, 100 per decade (~2.3% wide), so
+# p50/p99 over any number of examples cost a fixed few KiB and are within ~1.2%.
+LATENCY_EDGES_MS = np.geomspace(1e-3, 1e5, 801)
+
+
+def new_latency_hist() -> Dict[str, Any]:
+    return {"counts": np.zeros(len(LATENCY_EDGES_MS) + 1, dtype=np.int64), "sum": 0.0, "n": 0}
+
+
+def add_latency(hist: Dict[str, Any], latency_ms: float) -> None:
+    hist["counts"][int(np.searchsorted(LATENCY_EDGES_MS, latency_ms, side="right"))] += 1
+    hist["sum"] += latency_ms
+    hist["n"] += 1
+
+
+def hist_percentile(hist: Dict[str, Any], q: float) -> float:
+    """Approximate q-th percentile: the geometric midpoint of the bucket holding it."""
+    rank = max(1, int(np.ceil(q / 100.0 * hist["n"])))
+    b = int(np.searchsorted(np.cumsum(hist["counts"]), rank))
+    if b == 0:
+        return float(LATENCY_EDGES_MS[0])
+    if b >= len(LATENCY_EDGES_MS):
+        return float(LATENCY_EDGES_MS[-1])
+    return float(np.sqrt(LATENCY_EDGES_MS[b - 1] * LATENCY_EDGES_MS[b]))
+
+
+def hist_summary(hist: Dict[str, Any]) -> Dict[str, float]:
+    if not hist["n"]:
+        return {"p50": 0.0, "p99": 0.0, "mean": 0.0}
+    return {"p50": hist_percentile(hist, 50), "p99": hist_percentile(hist, 99), "mean": hist["sum"] / hist["n"]}
+
+
+def new_totals() -> Dict[str, Any]:
+    return {
+        "total": 0,
+        # hit@k
+        "hits": 0,
+        "missing_expected": 0,
+        # grounded@k
+        "grounded_hits": 0,
+        "missing_required_terms": 0,
+        # correct_citations@k
+        "correct_citation_hits": 0,
+        "missing_expected_for_correct": 0,
+        # latency (ms per query) and, for late interaction, the single-vector baseline
+        "latency_ms": new_latency_hist(),
+        "single_vector_hits": 0,
+        "single_vector_latency_ms": new_latency_hist(),
+        # semantic cache: hit rate and hit@k without the cache
+        "cache_lookups": 0,
+        "cache_hits": 0,
+        "uncached_hits": 0,
+        "cache_overlap_sum": 0.0,
+    }
+
+
+def tally(totals: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """Adds one per-example record to the running totals (None = skipped metric)."""
+    totals["total"] += 1
+
+    if record.get("hit_at_k") is None:
+        totals["missing_expected"] += 1
+    elif record["hit_at_k"]:
+        totals["hits"] += 1
+
+    if record.get("grounded_at_k") is None:
+        totals["missing_required_terms"] += 1
+    elif record["grounded_at_k"]:
+        totals["grounded_hits"] += 1
+
+    if record.get("correct_citations_at_k") is None:
+        totals["missing_expected_for_correct"] += 1
+    elif record["correct_citations_at_k"]:
+        totals["correct_citation_hits"] += 1
+
+    if record.get("latency_ms") is not None:
+        add_latency(totals["latency_ms"], record["latency_ms"])
+    if record.get("single_vector_latency_ms") is not None:
+        add_latency(totals["single_vector_latency_ms"], record["single_vector_latency_ms"])
+    if record.get("single_vector_hit_at_k"):
+        totals["single_vector_hits"] += 1
+
+    if record.get("cache_hit") is not None:
+        totals["cache_lookups"] += 1
+        totals["cache_hits"] += 1 if record["cache_hit"] else 0
+        totals["cache_overlap_sum"] += record.get("cache_overlap_at_k", 1.0) if record["cache_hit"] else 0.0
+        if record.get("uncached_hit_at_k"):
+            totals["uncached_hits"] += 1
+
+
+def build_summary(
+    totals: Dict[str, Any],
+    top_k: Optional[int],
+    model_name: Optional[str],
+    eval_path: Optional[Path],
+    retrieval: str = "single",
+    cache_threshold: Optional[float] = None,
+) -> Dict[str, Any]:
+    hit_scored_total = totals["total"] - totals["missing_expected"]
+    grounded_scored_total = totals["total"] - totals["missing_required_terms"]
+    correct_scored_total = totals["total"] - totals["missing_expected_for_correct"]
+
+    summary = {
+        "top_k": top_k,
+        "embedding_model": model_name,
+        "eval_set_path": str(eval_path) if eval_path is not None else None,
+        "retrieval": retrieval,
+        "total": totals["total"],
+        "hit_at_k": {
+            "value": (totals["hits"] / hit_scored_total) if hit_scored_total > 0 else 0.0,
+            "hits": totals["hits"],
+            "scored_total": hit_scored_total,
+            "skipped": totals["missing_expected"],
+        },
+        "grounded_at_k": {
+            "value": (totals["grounded_hits"] / grounded_scored_total) if grounded_scored_total > 0 else 0.0,
+            "hits": totals["grounded_hits"],
+            "scored_total": grounded_scored_total,
+            "skipped": totals["missing_required_terms"],
+        },
+        "correct_citations_at_k": {
+            "value": (totals["correct_citation_hits"] / correct_scored_total) if correct_scored_total > 0 else 0.0,
+            "hits": totals["correct_citation_hits"],
+            "scored_total": correct_scored_total,
+            "skipped": totals["missing_expected_for_correct"],
+        },
+        "latency_ms": hist_summary(totals["latency_ms"]),
+    }
+
+    if retrieval == "late":
+        summary["single_vector"] = {
+            "hit_at_k": {
+                "value": (totals["single_vector_hits"] / hit_scored_total) if hit_scored_total > 0 else 0.0,
+                "hits": totals["single_vector_hits"],
+                "scored_total": hit_scored_total,
+                "skipped": totals["missing_expected"],
+            },
+            "latency_ms": hist_summary(totals["single_vector_latency_ms"]),
+        }
+
+    if cache_threshold is not None:
+        lookups, cache_hits = totals["cache_lookups"], totals["cache_hits"]
+        uncached_value = (totals["uncached_hits"] / hit_scored_total) if hit_scored_total > 0 else 0.0
+        summary["semantic_cache"] = {
+            "threshold": cache_threshold,
+            "lookups": lookups,
+            "hits": cache_hits,
+            "hit_rate": (cache_hits / lookups) if lookups else 0.0,
+            # mean |cached top-k ∩ fresh top-k| / |fresh top-k| over cache hits
+            "mean_overlap_at_k": (totals["cache_overlap_sum"] / cache_hits) if cache_hits else 1.0,
+            "uncached_hit_at_k": {"value": uncached_value, "hits": totals["uncached_hits"], "scored_total": hit_scored_total},
+            "hit_at_k_cost": uncached_value - summary["hit_at_k"]["value"],
+        }
+    return summary
+
+
+def skip_done(examples: Iterator[Dict[str, Any]], report_path: Path, n_done: int) -> Iterator[Dict[str, Any]]:
+    """
+    Skips the first n_done examples, which a resumed report already holds (records are
+    written in eval-set order, so this also covers examples without an id).
+    Raises ValueError if the report's ids don't line up with the eval set.
+    """
+    written = iter_examples(report_path)
+    for i in range(n_done):
+        ex = next(examples, None)
+        rec = next(written, None)
+        if ex is None or rec is None or ex.get("id", "") != rec.get("id", ""):
+            raise ValueError(f"{report_path} does not match the eval set at example {i + 1}")
+    return examples
+
+
+def resume_report(
+    path: Path, examples: Iterator[Dict[str, Any]], settings: Dict[str, Any]
+) -> Tuple[Iterator[Dict[str, Any]], Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Prepares path for --resume: returns (examples still to run, totals replayed from the
+    kept records, settings the report was written with or None). A missing report
+    resumes from the start. Raises ValueError if the report was written with different
+    settings or doesn't line up with the eval set.
+    """
+    n_done, prev_settings = prepare_resume(path, settings)
+    remaining = skip_done(examples, path, n_done)
+    totals = new_totals()
+    if n_done > 0:
+        for rec in iter_examples(path):
+            tally(totals, rec)
+    return remaining, totals, prev_settings
+
+
+def _write_run(records: List[Dict[str, Any]], tmp_dir: str) -> str:
+    records.sort(key=lambda r: r["id"])
+    fd, name = tempfile.mkstemp(suffix=".jsonl", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    return name
+
+
+def _is_sorted_by_id(path: Path) -> bool:
+    prev: Optional[str] = None
+    for rec in iter_examples(path):
+        ex_id = rec.get("id", "")
+        if not ex_id:
+            continue
+        if prev is not None and ex_id < prev:
+            return False
+        prev = ex_id
+    return True
+
+
+def iter_sorted_examples(path: Path, run_size: int = 100_000) -> Iterator[Dict[str, Any]]:
+    """
+    Yields example records with a non-empty id in id order, holding at most run_size
+    records in memory. Already-sorted reports are streamed directly; otherwise an
+    external merge sort spills sorted runs to temp files and heap-merges them.
+    """
+    if _is_sorted_by_id(path):
+        for rec in iter_examples(path):
+            if rec.get("id", ""):
+                yield rec
+        return
+
+    with tempfile.TemporaryDirectory(prefix="report_sort_") as tmp_dir:
+        run_paths = []
+        buf: List[Dict[str, Any]] = []
+        for rec in iter_examples(path):
+            if not rec.get("id", ""):
+                continue
+            buf.append(rec)
+            if len(buf) >= run_size:
+                run_paths.append(_write_run(buf, tmp_dir))
+                buf = []
+        if buf:
+            run_paths.append(_write_run(buf, tmp_dir))
+
+        streams = [iter_jsonl(Path(p)) for p in run_paths]
+        yield from heapq.merge(*streams, key=lambda r: r["id"])
+
+
+def merge_join(
+    before: Iterator[Dict[str, Any]],
+    after: Iterator[Dict[str, Any]],
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """
+    Full outer join of two id-sorted example streams.
+    Yields (id, before_or_None, after_or_None). Duplicate ids keep the last record.
+    """
+
+    def dedup(it: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        prev = None
+        for rec in it:
+            if prev is not None and rec["id"] != prev["id"]:
+                yield prev
+            prev = rec
+        if prev is not None:
+            yield prev
+
+    b_it = dedup(before)
+    a_it = dedup(after)
+    b = next(b_it, None)
+    a = next(a_it, None)
+
+    while b is not None or a is not None:
+        if a is None or (b is not None and b["id"] < a["id"]):
+            yield b["id"], b, None
+            b = next(b_it, None)
+        elif b is None or a["id"] < b["id"]:
+            yield a["id"], None, a
+            a = next(a_it, None)
+        else:
+            yield a["id"], b, a
+            b = next(b_it, None)
+            a = next(a_it, None)
@@ -1,25 +1,30 @@
 import argparse
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from src.artifacts import current_build_id, resolve_index_dir
 from src.config import get_repo_root, load_config
-from src.answer import build_answer
-
-
-def load_jsonl(path: Path) -> List[Dict[str, Any]]:
-    rows = []
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            rows.append(json.loads(line))
-    return rows
+from src.answer import build_answer, search_batch
+from src.batch import map_batches
+from src.late_interaction import load_token_store
+from src.semantic_cache import SemanticCache
+from eval.report_io import (
+    EXAMPLE,
+    SETTINGS,
+    SUMMARY,
+    append_record,
+    build_summary,
+    is_jsonl_report,
+    iter_jsonl,
+    new_totals,
+    resume_report,
+    tally,
+)
 
 
 def load_meta(meta_path: Path) -> List[Dict[str, Any]]:
@@ -38,24 +43,55 @@ def contains_all_terms(text: str, terms: List[str]) -> bool:
     return all(term.lower() in t for term in terms)
 
 
-def search(
+def search_examples(
     model: SentenceTransformer,
     index: faiss.Index,
     meta: List[Dict[str, Any]],
-    question: str,
+    examples: List[Dict[str, Any]],
     top_k: int,
-) -> List[Tuple[int, float, str, str, Dict[str, Any]]]:
-    q_emb = model.encode([question], normalize_embeddings=True)
-    q_emb = np.asarray(q_emb, dtype=np.float32)
+    token_store: Optional[Dict[str, np.ndarray]] = None,
+    candidates: int = 50,
+    cache: Optional[SemanticCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Retrieves for a batch of eval examples through src.answer.search_batch (the same
+    path as src.batch) and attaches citations.
+
+    Returns per example {"results", "latency_ms"}. With a token_store (late interaction),
+    the FAISS first stage doubles as the single-vector baseline, so "single_vector_results"
+    and "single_vector_latency_ms" are returned too at no extra cost.
+
+    With a semantic cache, "cache_hit" is set, and cache hits are also retrieved
+    without the cache ("uncached_results") so the quality cost can be measured.
+    """
+    questions = [ex["question"].strip() for ex in examples]
+    out = []
+    batch = search_batch(model, index, meta, questions, top_k, token_store=token_store, candidates=candidates, cache=cache)
+    for res in batch:
+        item = {"results": with_citations(res["hits"]), "latency_ms": res["latency_ms"]}
+        if "single_vector_hits" in res:
+            item["single_vector_results"] = with_citations(res["single_vector_hits"])
+            item["single_vector_latency_ms"] = res["single_vector_latency_ms"]
+        if cache is not None:
+            item["cache_hit"] = res["cache_hit"]
+            item["cache_similarity"] = res.get("cache_similarity")
+        out.append(item)
+
+    hit_ids = [b for b, item in enumerate(out) if item.get("cache_hit")]
+    if hit_ids:
+        fresh = search_batch(
+            model, index, meta, [questions[b] for b in hit_ids], top_k, token_store=token_store, candidates=candidates
+        )
+        for b, res in zip(hit_ids, fresh):
+            out[b]["uncached_results"] = with_citations(res["hits"])
+    return out
+
 
-    scores, ids = index.search(q_emb, top_k)
+def with_citations(
+    hits: List[Tuple[int, float, Dict[str, Any]]],
+) -> List[Tuple[int, float, str, str, Dict[str, Any]]]:
     results = []
-    for r in range(top_k):
-        idx = int(ids[0][r])
-        score = float(scores[0][r])
-        if idx < 0 or idx >= len(meta):
-            continue
-        row = meta[idx]
+    for idx, score, row in hits:
         citation = f"{row.get('source_file', 'unknown')}#{row.get('chunk_id', f'row_{idx}')}"
         text = row.get("text", "")
         results.append((idx, score, citation, text, row))
@@ -72,7 +108,39 @@ def main():
     parser = argparse.ArgumentParser(description="Evaluation harness (hit@k + grounded@k + correct_citations@k).")
     parser.add_argument("--config", type=str, default=None, help="Path to config YAML (optional).")
     parser.add_argument("--top_k", type=int, default=5, help="k for metrics.")
-    parser.add_argument("--out", type=str, default=None, help="Optional path to write JSON results (local).")
+    parser.add_argument(
+        "--out",
+        type=str,
+        default=None,
+        help="Optional path to write results (local). A .jsonl path is written incrementally, one record per example.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="With a .jsonl --out: keep examples already written and only evaluate the rest.",
+    )
+    parser.add_argument(
+        "--retrieval",
+        type=str,
+        choices=["single", "late"],
+        default="single",
+        help="late = rerank FAISS candidates by token-level MaxSim; also reports the single-vector baseline.",
+    )
+    parser.add_argument("--candidates", type=int, default=50, help="First-stage candidates for --retrieval late.")
+    parser.add_argument(
+        "--cache_threshold",
+        type=float,
+        default=None,
+        help="Evaluate with the semantic cache at this similarity threshold (reports hit rate and quality cost).",
+    )
+    parser.add_argument("--cache_size", type=int, default=10000, help="Max cached questions (LRU eviction).")
+    parser.add_argument("--cache_ttl", type=float, default=None, help="Cached entries expire after this many seconds.")
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1,
+        help="Questions per encoder batch (>1 for throughput; latency_ms is then amortized per question).",
+    )
     args = parser.parse_args()
 
     cfg = load_config(args.config)
@@ -82,8 +150,9 @@ def main():
     model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
 
     eval_path = repo_root / "eval" / "eval_set.jsonl"
-    index_path = repo_root / "data" / "index" / "faiss.index"
-    meta_path = repo_root / "data" / "index" / "meta.jsonl"
+    index_dir = resolve_index_dir(repo_root / "data" / "index")
+    index_path = index_dir / "faiss.index"
+    meta_path = index_dir / "meta.jsonl"
 
     if not eval_path.exists():
         print(f"Missing eval set: {eval_path}")
@@ -95,70 +164,114 @@ def main():
         print("  python -m src.index")
         return
 
-    eval_rows = load_jsonl(eval_path)
-    meta = load_meta(meta_path)
-    index = faiss.read_index(str(index_path))
-    model = SentenceTransformer(model_name)
+    out_path = None
+    if args.out:
+        out_path = Path(args.out)
+        if not out_path.is_absolute():
+            out_path = repo_root / out_path
+    streaming = out_path is not None and is_jsonl_report(out_path)
 
-    total = 0
+    if args.resume and not streaming:
+        print("--resume requires a .jsonl --out path.")
+        return
 
-    # hit@k
-    hits = 0
-    missing_expected = 0
+    # Options that change per-example results; a resumed report must not mix them.
+    settings = {
+        "embedding_model": model_name,
+        "top_k": args.top_k,
+        "retrieval": args.retrieval,
+        "candidates": args.candidates if args.retrieval == "late" else None,
+        "cache_threshold": args.cache_threshold,
+    }
+
+    totals = new_totals()
+    pending = (ex for ex in iter_jsonl(eval_path) if ex.get("question", "").strip())
+    write_settings = True
+    if args.resume:
+        try:
+            pending, totals, prev_settings = resume_report(out_path, pending, settings)
+        except ValueError as e:
+            print(f"Cannot resume: {e}")
+            print("Rerun with the original settings, or without --resume to start a fresh report.")
+            return
+        if prev_settings is None and totals["total"] > 0:
+            print(f"WARNING: {out_path} has no settings record; cannot check it was run with the same settings.")
+        write_settings = prev_settings is None and totals["total"] == 0
 
-    # grounded@k
-    grounded_hits = 0
-    missing_required_terms = 0
+    meta = load_meta(meta_path)
+    index = faiss.read_index(str(index_path))
+    model = SentenceTransformer(model_name)
 
-    # correct_citations@k
-    correct_citation_hits = 0
-    missing_expected_for_correct = 0
+    token_store = None
+    if args.retrieval == "late":
+        token_store = load_token_store(index_dir)
+        if token_store is None:
+            print("Index has no late-interaction token store. Rebuild with:")
+            print("  python -m src.index --late_interaction")
+            return
+
+    cache = None
+    if args.cache_threshold is not None:
+        cache = SemanticCache(
+            index.d,
+            threshold=args.cache_threshold,
+            max_size=args.cache_size,
+            ttl_s=args.cache_ttl,
+            build_id=current_build_id(repo_root / "data" / "index"),
+        )
 
+    # Only the legacy single-JSON report keeps every example in memory.
     per_example: List[Dict[str, Any]] = []
 
+    report_f = None
+    if streaming:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        report_f = out_path.open("a" if args.resume else "w", encoding="utf-8")
+        if write_settings:
+            append_record(report_f, {"type": SETTINGS, "settings": settings})
+
     print(f"Config: {args.config or '(auto)'}")
     print(f"Embedding model: {model_name}")
     print(f"Eval set: {eval_path}")
     print(f"top_k: {args.top_k}")
+    print(f"retrieval: {args.retrieval}" + (f" (candidates={args.candidates})" if args.retrieval == "late" else ""))
+    if args.resume:
+        print(f"Resuming: {totals['total']} examples already in {out_path}")
     print("-" * 72)
 
-    for ex in eval_rows:
+    def retrieve(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return search_examples(
+            model, index, meta, batch, args.top_k, token_store=token_store, candidates=args.candidates, cache=cache
+        )
+
+    for ex, retrieval in map_batches(pending, retrieve, max(1, args.batch_size)):
         ex_id = ex.get("id", "")
         q = ex.get("question", "").strip()
         expected = ex.get("expected_citations", [])
         required_terms = ex.get("required_terms", [])
 
-        if not q:
-            continue
-
-        total += 1
-        results = search(model, index, meta, q, args.top_k)
+        results = retrieval["results"]
         retrieved_citations = [c for _, _, c, _, _ in results]
         retrieved_texts = [t for _, _, _, t, _ in results]
 
         # hit@k
         if not expected:
-            missing_expected += 1
             hit_status = "SKIP"
             hit = None
         else:
             hit = any(e in retrieved_citations for e in expected)
-            hits += 1 if hit else 0
             hit_status = "HIT" if hit else "MISS"
 
         # grounded@k
         if not required_terms:
-            missing_required_terms += 1
             grounded_status = "SKIP"
             grounded = None
         else:
             grounded = any(contains_all_terms(t, required_terms) for t in retrieved_texts)
-            grounded_hits += 1 if grounded else 0
             grounded_status = "GROUNDED" if grounded else "UNGROUNDED"
 
         # correct_citations@k
         if not expected:
-            missing_expected_for_correct += 1
             correct_status = "SKIP"
             correct_citations = None
             answer_citations = []
@@ -168,7 +281,6 @@ def main():
             answer_citations = [c["citation"] for c in answer_payload.get("citations", [])]
 
             correct_citations = any(c in expected for c in answer_citations) and len(answer_citations) > 0
-            correct_citation_hits += 1 if correct_citations else 0
             correct_status = "CORRECT_CITATIONS" if correct_citations else "WRONG_CITATIONS"
 
         print(f"[{hit_status} | {grounded_status} | {correct_status}] Q: {q}")
@@ -178,68 +290,87 @@ def main():
             print(f"  required_terms: {required_terms}")
         print(f"  retrieved_citations: {retrieved_citations[: min(len(retrieved_citations), 5)]}")
 
-        per_example.append(
-            {
-                "id": ex_id,
-                "question": q,
-                "expected_citations": expected,
-                "required_terms": required_terms,
-                "retrieved_citations": retrieved_citations,
-                "hit_at_k": hit,
-                "grounded_at_k": grounded,
-                "correct_citations_at_k": correct_citations,
-                "answer_citations": answer_citations,
-            }
-        )
-
-    hit_scored_total = total - missing_expected
-    grounded_scored_total = total - missing_required_terms
-    correct_scored_total = total - missing_expected_for_correct
-
-    hit_rate = (hits / hit_scored_total) if hit_scored_total > 0 else 0.0
-    grounded_rate = (grounded_hits / grounded_scored_total) if grounded_scored_total > 0 else 0.0
-    correct_rate = (correct_citation_hits / correct_scored_total) if correct_scored_total > 0 else 0.0
+        record = {
+            "id": ex_id,
+            "question": q,
+            "expected_citations": expected,
+            "required_terms": required_terms,
+            "retrieved_citations": retrieved_citations,
+            "hit_at_k": hit,
+            "grounded_at_k": grounded,
+            "correct_citations_at_k": correct_citations,
+            "answer_citations": answer_citations,
+            "latency_ms": retrieval["latency_ms"],
+        }
+        if token_store is not None:
+            single_citations = [c for _, _, c, _, _ in retrieval["single_vector_results"]]
+            record["single_vector_retrieved_citations"] = single_citations
+            record["single_vector_hit_at_k"] = any(e in single_citations for e in expected) if expected else None
+            record["single_vector_latency_ms"] = retrieval["single_vector_latency_ms"]
+        if cache is not None:
+            record["cache_hit"] = retrieval["cache_hit"]
+            if retrieval["cache_hit"]:
+                fresh_citations = [c for _, _, c, _, _ in retrieval["uncached_results"]]
+                record["cache_similarity"] = retrieval["cache_similarity"]
+                record["uncached_retrieved_citations"] = fresh_citations
+                record["cache_overlap_at_k"] = (
+                    len(set(fresh_citations) & set(retrieved_citations)) / len(fresh_citations) if fresh_citations else 1.0
+                )
+            else:
+                fresh_citations = retrieved_citations
+            record["uncached_hit_at_k"] = any(e in fresh_citations for e in expected) if expected else None
+        tally(totals, record)
+
+        if report_f is not None:
+            append_record(report_f, {"type": EXAMPLE, **record})
+        elif out_path is not None:
+            per_example.append(record)
+
+    summary = build_summary(
+        totals, args.top_k, model_name, eval_path, retrieval=args.retrieval, cache_threshold=args.cache_threshold
+    )
+    summary["settings"] = settings
+    hit_m = summary["hit_at_k"]
+    grounded_m = summary["grounded_at_k"]
+    correct_m = summary["correct_citations_at_k"]
 
     print("-" * 72)
-    print(f"Examples total: {total}")
-    print(f"hit@{args.top_k}: {hit_rate:.3f} ({hits}/{hit_scored_total})  [skipped_missing_expected={missing_expected}]")
+    print(f"Examples total: {summary['total']}")
     print(
-        f"grounded@{args.top_k}: {grounded_rate:.3f} ({grounded_hits}/{grounded_scored_total})  "
-        f"[skipped_missing_required_terms={missing_required_terms}]"
+        f"hit@{args.top_k}: {hit_m['value']:.3f} ({hit_m['hits']}/{hit_m['scored_total']})  "
+        f"[skipped_missing_expected={hit_m['skipped']}]"
     )
     print(
-        f"correct_citations@{args.top_k}: {correct_rate:.3f} ({correct_citation_hits}/{correct_scored_total})  "
-        f"[skipped_missing_expected={missing_expected_for_correct}]"
+        f"grounded@{args.top_k}: {grounded_m['value']:.3f} ({grounded_m['hits']}/{grounded_m['scored_total']})  "
+        f"[skipped_missing_required_terms={grounded_m['skipped']}]"
     )
+    print(
+        f"correct_citations@{args.top_k}: {correct_m['value']:.3f} ({correct_m['hits']}/{correct_m['scored_total']})  "
+        f"[skipped_missing_expected={correct_m['skipped']}]"
+    )
+    lat = summary["latency_ms"]
+    print(f"retrieval latency ({args.retrieval}): p50={lat['p50']:.2f}ms  p99={lat['p99']:.2f}ms")
+    if "single_vector" in summary:
+        sv = summary["single_vector"]
+        sv_hit, sv_lat = sv["hit_at_k"], sv["latency_ms"]
+        print(
+            f"single-vector baseline: hit@{args.top_k}: {sv_hit['value']:.3f} ({sv_hit['hits']}/{sv_hit['scored_total']})  "
+            f"latency p50={sv_lat['p50']:.2f}ms  p99={sv_lat['p99']:.2f}ms"
+        )
+    if "semantic_cache" in summary:
+        sc = summary["semantic_cache"]
+        print(
+            f"semantic cache (threshold={sc['threshold']}): hit_rate={sc['hit_rate']:.3f} ({sc['hits']}/{sc['lookups']})  "
+            f"hit@{args.top_k} without cache={sc['uncached_hit_at_k']['value']:.3f}  "
+            f"cost={sc['hit_at_k_cost']:+.3f}  mean_overlap@{args.top_k}={sc['mean_overlap_at_k']:.3f}"
+        )
 
-    if args.out:
-        out_path = Path(args.out)
-        if not out_path.is_absolute():
-            out_path = repo_root / out_path
-
-        payload = {
-            "summary": {
-                "top_k": args.top_k,
-                "embedding_model": model_name,
-                "eval_set_path": str(eval_path),
-                "total": total,
-                "hit_at_k": {"value": hit_rate, "hits": hits, "scored_total": hit_scored_total, "skipped": missing_expected},
-                "grounded_at_k": {
-                    "value": grounded_rate,
-                    "hits": grounded_hits,
-                    "scored_total": grounded_scored_total,
-                    "skipped": missing_required_terms,
-                },
-                "correct_citations_at_k": {
-                    "value": correct_rate,
-                    "hits": correct_citation_hits,
-                    "scored_total": correct_scored_total,
-                    "skipped": missing_expected_for_correct,
-                },
-            },
-            "examples": per_example,
-        }
-        write_json(out_path, payload)
+    if report_f is not None:
+        append_record(report_f, {"type": SUMMARY, **summary})
+        report_f.close()
+        print(f"Wrote JSONL results to: {out_path}")
+    elif out_path is not None:
+        write_json(out_path, {"summary": summary, "examples": per_example})
         print(f"Wrote JSON results to: {out_path}")
 
 
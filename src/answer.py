@@ -1,13 +1,18 @@
 import argparse
 import json
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from src.artifacts import resolve_index_dir
 from src.config import get_repo_root, load_config
+from src.extractive import extract_quotes, load_sentence_store
+from src.late_interaction import encode_tokens, load_token_store, rerank
+from src.semantic_cache import SemanticCache
 
 
 def load_meta(meta_path: Path) -> List[Dict[str, Any]]:
@@ -32,46 +37,168 @@ def format_quote(text: str, max_chars: int = 320) -> str:
     return t[: max_chars - 3] + "..."
 
 
-def search(
+def embed_question(model: SentenceTransformer, question: str) -> np.ndarray:
+    q_emb = model.encode([question], normalize_embeddings=True)
+    return np.asarray(q_emb, dtype=np.float32)
+
+
+def search_batch_ids(
+    index: faiss.Index,
+    meta: List[Dict[str, Any]],
+    q_emb: np.ndarray,
+    top_k: int,
+) -> List[List[Tuple[int, float, Dict[str, Any]]]]:
+    """One FAISS search for a (B, d) batch of question embeddings; keeps the meta row index."""
+    scores, ids = index.search(q_emb, top_k)
+    batch: List[List[Tuple[int, float, Dict[str, Any]]]] = []
+
+    for b in range(q_emb.shape[0]):
+        results: List[Tuple[int, float, Dict[str, Any]]] = []
+        for r in range(top_k):
+            idx = int(ids[b][r])
+            score = float(scores[b][r])
+            if idx < 0 or idx >= len(meta):
+                continue
+            results.append((idx, score, meta[idx]))
+        batch.append(results)
+
+    return batch
+
+
+def search_ids(
+    index: faiss.Index,
+    meta: List[Dict[str, Any]],
+    q_emb: np.ndarray,
+    top_k: int,
+) -> List[Tuple[int, float, Dict[str, Any]]]:
+    """Like search(), for a precomputed (1, d) question embedding; keeps the meta row index."""
+    return search_batch_ids(index, meta, q_emb, top_k)[0]
+
+
+def search_batch(
     model: SentenceTransformer,
     index: faiss.Index,
     meta: List[Dict[str, Any]],
-    question: str,
+    questions: List[str],
     top_k: int,
-) -> List[Tuple[float, Dict[str, Any]]]:
-    q_emb = model.encode([question], normalize_embeddings=True)
-    q_emb = np.asarray(q_emb, dtype=np.float32)
+    token_store: Optional[Dict[str, np.ndarray]] = None,
+    candidates: int = 50,
+    cache: Optional[SemanticCache] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Retrieval for a batch of questions: one encoder call and one FAISS search.
 
-    scores, ids = index.search(q_emb, top_k)
-    results: List[Tuple[float, Dict[str, Any]]] = []
+    Returns one dict per question with "q_emb" (d,), "hits" [(row index, score, row)]
+    and "latency_ms" (batch time amortized per question). With a token_store, the
+    FAISS hits (max(candidates, top_k) of them) are reranked by late-interaction
+    MaxSim, and the first stage is also returned as "single_vector_hits" /
+    "single_vector_latency_ms" for comparison.
+
+    With a cache, questions close enough to an earlier one reuse its hits and skip
+    the search; their dicts carry "cache_hit": True and "cache_similarity".
+    """
+    t0 = time.perf_counter()
+    q_emb = np.asarray(model.encode(questions, batch_size=len(questions), normalize_embeddings=True), dtype=np.float32)
+
+    cached: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+    if cache is not None:
+        cached = [cache.lookup(q_emb[b], top_k) for b in range(len(questions))]
+    todo = [b for b in range(len(questions)) if cached[b] is None]
+
+    first: Dict[int, List[Tuple[int, float, Dict[str, Any]]]] = {}
+    if todo:
+        first_k = max(candidates, top_k) if token_store is not None else top_k
+        first = dict(zip(todo, search_batch_ids(index, meta, q_emb[todo], first_k)))
+    single_ms = (time.perf_counter() - t0) * 1000.0 / len(questions)
 
-    for r in range(top_k):
-        idx = int(ids[0][r])
-        score = float(scores[0][r])
-        if idx < 0 or idx >= len(meta):
+    reranked: Dict[int, List[Tuple[int, float, Dict[str, Any]]]] = {}
+    if token_store is not None and todo:
+        q_toks = encode_tokens(model, [questions[b] for b in todo], batch_size=len(todo))
+        reranked = {b: rerank(token_store, q_tok, first[b])[:top_k] for b, q_tok in zip(todo, q_toks)}
+    total_ms = (time.perf_counter() - t0) * 1000.0 / len(questions)
+
+    def with_rows(ids_scores: List[Tuple[int, float]]) -> List[Tuple[int, float, Dict[str, Any]]]:
+        return [(idx, score, meta[idx]) for idx, score in ids_scores]
+
+    def ids_only(hits: List[Tuple[int, float, Dict[str, Any]]]) -> List[Tuple[int, float]]:
+        return [(idx, score) for idx, score, _ in hits]
+
+    out = []
+    for b in range(len(questions)):
+        res: Dict[str, Any] = {"q_emb": q_emb[b], "latency_ms": total_ms}
+        if cached[b] is not None:
+            res["hits"] = with_rows(cached[b]["hits"])[:top_k]
+            if token_store is not None:
+                res["single_vector_hits"] = with_rows(cached[b].get("single_vector_hits", []))[:top_k]
+                res["single_vector_latency_ms"] = single_ms
+            res["cache_hit"] = True
+            res["cache_similarity"] = cached[b]["similarity"]
+            out.append(res)
             continue
-        results.append((score, meta[idx]))
 
-    return results
+        if token_store is None:
+            res["hits"] = first[b]
+        else:
+            res["hits"] = reranked[b]
+            res["single_vector_hits"] = first[b][:top_k]
+            res["single_vector_latency_ms"] = single_ms
+
+        if cache is not None:
+            entry = {"hits": ids_only(res["hits"])}
+            if token_store is not None:
+                entry["single_vector_hits"] = ids_only(res["single_vector_hits"])
+            cache.insert(q_emb[b], top_k, entry)
+            res["cache_hit"] = False
+        out.append(res)
+
+    return out
+
+
+def search(
+    model: SentenceTransformer,
+    index: faiss.Index,
+    meta: List[Dict[str, Any]],
+    question: str,
+    top_k: int,
+) -> List[Tuple[float, Dict[str, Any]]]:
+    q_emb = embed_question(model, question)
+    return [(score, row) for _, score, row in search_ids(index, meta, q_emb, top_k)]
 
 
-def build_answer(question: str, retrieved: List[Tuple[float, Dict[str, Any]]], max_quotes: int) -> Dict[str, Any]:
+def build_answer(
+    question: str,
+    retrieved: List[Tuple[float, Dict[str, Any]]],
+    max_quotes: int,
+    extracted: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
     """
     Audit-first baseline:
     - No generation beyond selecting and quoting evidence.
     - Answer is a short evidence summary + quotes.
+
+    extracted: optional sentence-level quotes from extract_quotes(). When given, they
+    replace the leading-characters quotes, and citations list the chunks they come from.
     """
     citations = []
     quotes = []
 
-    for score, row in retrieved[:max_quotes]:
-        source_file = row.get("source_file", "unknown")
-        chunk_id = row.get("chunk_id", "unknown")
-        citation = f"{source_file}#{chunk_id}"
-        text = row.get("text", "")
+    if extracted is None:
+        for score, row in retrieved[:max_quotes]:
+            source_file = row.get("source_file", "unknown")
+            chunk_id = row.get("chunk_id", "unknown")
+            citation = f"{source_file}#{chunk_id}"
+            text = row.get("text", "")
 
-        citations.append({"citation": citation, "score": score})
-        quotes.append({"citation": citation, "quote": format_quote(text)})
+            citations.append({"citation": citation, "score": score})
+            quotes.append({"citation": citation, "quote": format_quote(text)})
+    else:
+        retrieval_scores = {
+            f"{row.get('source_file', 'unknown')}#{row.get('chunk_id', 'unknown')}": score for score, row in retrieved
+        }
+        for q in extracted[:max_quotes]:
+            if all(c["citation"] != q["citation"] for c in citations):
+                citations.append({"citation": q["citation"], "score": retrieval_scores.get(q["citation"], 0.0)})
+            quotes.append(q)
 
     answer_text = (
         "Evidence-first response (baseline):\n"
@@ -87,12 +214,49 @@ def build_answer(question: str, retrieved: List[Tuple[float, Dict[str, Any]]], m
     }
 
 
+def answer_batch(
+    model: SentenceTransformer,
+    index: faiss.Index,
+    meta: List[Dict[str, Any]],
+    questions: List[str],
+    top_k: int,
+    max_quotes: int,
+    token_store: Optional[Dict[str, np.ndarray]] = None,
+    sentence_store: Optional[Dict[str, np.ndarray]] = None,
+    candidates: int = 50,
+    cache: Optional[SemanticCache] = None,
+) -> List[Dict[str, Any]]:
+    """build_answer() payloads for a batch of questions, in input order."""
+    payloads = []
+    results = search_batch(model, index, meta, questions, top_k, token_store, candidates, cache=cache)
+    for question, res in zip(questions, results):
+        retrieved = [(score, row) for _, score, row in res["hits"]]
+        extracted = None
+        if sentence_store is not None:
+            extracted = extract_quotes(sentence_store, res["q_emb"], res["hits"], max_quotes=max_quotes)
+        payloads.append(build_answer(question, retrieved, max_quotes=max_quotes, extracted=extracted))
+    return payloads
+
+
 def main():
     parser = argparse.ArgumentParser(description="Citation-backed answering (audit-first baseline, no LLM).")
     parser.add_argument("--config", type=str, default=None, help="Path to config YAML (optional).")
     parser.add_argument("--question", type=str, required=True, help="Question to answer.")
     parser.add_argument("--top_k", type=int, default=5, help="Chunks to retrieve.")
     parser.add_argument("--max_quotes", type=int, default=2, help="How many evidence quotes to include.")
+    parser.add_argument(
+        "--retrieval",
+        type=str,
+        choices=["single", "late"],
+        default="single",
+        help="single = one pooled vector per chunk; late = rerank FAISS candidates by token-level MaxSim.",
+    )
+    parser.add_argument("--candidates", type=int, default=50, help="First-stage candidates for --retrieval late.")
+    parser.add_argument(
+        "--extractive",
+        action="store_true",
+        help="Quote the best-matching sentences (needs an index built with --sentences).",
+    )
     parser.add_argument("--json", action="store_true", help="Print machine-readable JSON output.")
     args = parser.parse_args()
 
@@ -102,8 +266,9 @@ def main():
     retrieval_cfg = cfg.get("retrieval", {})
     model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
 
-    index_path = repo_root / "data" / "index" / "faiss.index"
-    meta_path = repo_root / "data" / "index" / "meta.jsonl"
+    index_dir = resolve_index_dir(repo_root / "data" / "index")
+    index_path = index_dir / "faiss.index"
+    meta_path = index_dir / "meta.jsonl"
 
     if not index_path.exists() or not meta_path.exists():
         print("Missing index artifacts. Run:")
@@ -115,8 +280,33 @@ def main():
     index = faiss.read_index(str(index_path))
     model = SentenceTransformer(model_name)
 
-    retrieved = search(model, index, meta, args.question, args.top_k)
-    payload = build_answer(args.question, retrieved, max_quotes=args.max_quotes)
+    sentence_store = None
+    if args.extractive:
+        sentence_store = load_sentence_store(index_dir)
+        if sentence_store is None:
+            print("Index has no sentence store. Rebuild with:")
+            print("  python -m src.index --sentences")
+            return
+
+    token_store = None
+    if args.retrieval == "late":
+        token_store = load_token_store(index_dir)
+        if token_store is None:
+            print("Index has no late-interaction token store. Rebuild with:")
+            print("  python -m src.index --late_interaction")
+            return
+
+    payload = answer_batch(
+        model,
+        index,
+        meta,
+        [args.question],
+        args.top_k,
+        args.max_quotes,
+        token_store=token_store,
+        sentence_store=sentence_store,
+        candidates=args.candidates,
+    )[0]
 
     if args.json:
         print(json.dumps(payload, ensure_ascii=False, indent=2))
@@ -132,7 +322,8 @@ def main():
     print()
     print("EVIDENCE QUOTES")
     for q in payload["quotes"]:
-        print(f"- {q['citation']}: {q['quote']}")
+        offsets = f" [{q['start']}:{q['end']}]" if "start" in q else ""
+        print(f"- {q['citation']}{offsets}: {q['quote']}")
 
 
 if __name__ == "__main__":
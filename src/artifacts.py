@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+CURRENT_FILE = "CURRENT"
+BUILDS_DIR = "builds"
+
+
+def _fsync_dir(path: Path) -> None:
+    # Directory fsync makes the rename itself durable; not supported on Windows.
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def fsync_tree(path: Path) -> None:
+    """Flushes every file under path to disk, then the directories, so a published build survives a power loss."""
+    for dirpath, _, filenames in os.walk(str(path), topdown=False):
+        for name in filenames:
+            # Read-write handle: Windows refuses fsync on a read-only one.
+            with open(os.path.join(dirpath, name), "rb+") as f:
+                os.fsync(f.fileno())
+        _fsync_dir(Path(dirpath))
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """
+    Writes data to a temp file next to path, fsyncs it, then renames it over path.
+    Readers see either the old file or the new one, never a partial write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    _fsync_dir(path.parent)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_save_npz(path: Path, **arrays: np.ndarray) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    _fsync_dir(path.parent)
+
+
+def current_build_id(index_root: Path) -> Optional[str]:
+    """
+    The published build id, or None for a legacy flat layout / no build yet.
+    Long-running readers can poll this to notice a rebuild and reload.
+    """
+    pointer = index_root / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    build_id = pointer.read_text(encoding="utf-8").strip()
+    return build_id or None
+
+
+def resolve_index_dir(index_root: Path) -> Path:
+    """
+    Directory holding the faiss.index/meta.jsonl pair readers should use.
+
+    Builds are written to index_root/builds/<build_id>/ and published by atomically
+    replacing index_root/CURRENT, so the pair always comes from one complete build.
+    Falls back to index_root itself for indexes built before this layout existed.
+    """
+    return build_dir_for(index_root, current_build_id(index_root))
+
+
+def build_dir_for(index_root: Path, build_id: Optional[str]) -> Path:
+    if build_id is None:
+        return index_root
+    return index_root / BUILDS_DIR / build_id
+
+
+def new_build_dir(index_root: Path, build_id: str) -> Path:
+    builds = index_root / BUILDS_DIR
+    builds.mkdir(parents=True, exist_ok=True)
+    candidate = builds / build_id
+    n = 1
+    while candidate.exists():
+        candidate = builds / f"{build_id}-{n}"
+        n += 1
+    candidate.mkdir()
+    return candidate
+
+
+def publish_build(index_root: Path, build_dir: Path, keep: int = 2) -> None:
+    """
+    Points CURRENT at build_dir, then prunes builds older than it so that at most
+    `keep` remain (including build_dir). The previous build is kept by default so a
+    live process can finish with it. Newer dirs (e.g. a concurrent build) are left alone.
+    """
+    atomic_write_text(index_root / CURRENT_FILE, build_dir.name + "\n")
+
+    older = sorted(p for p in (index_root / BUILDS_DIR).iterdir() if p.is_dir() and p.name < build_dir.name)
+    stale = older[: max(0, len(older) - (keep - 1))]
+    for p in stale:
+        shutil.rmtree(p, ignore_errors=True)
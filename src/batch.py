@@ -0,0 +1,253 @@
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import faiss
+from sentence_transformers import SentenceTransformer
+
+from src.answer import answer_batch, load_meta
+from src.artifacts import build_dir_for, current_build_id, resolve_index_dir
+from src.config import get_repo_root, load_config
+from src.extractive import load_sentence_store
+from src.late_interaction import load_token_store
+from src.semantic_cache import SemanticCache
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_JSON_TYPES = {bool: "boolean", int: "number", float: "number", list: "array", type(None): "null"}
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def map_batches(
+    items: Iterable[T],
+    fn: Callable[[List[T]], List[R]],
+    batch_size: int,
+    window: int = 4,
+) -> Iterator[Tuple[T, R]]:
+    """
+    Streams items through fn in batches and yields (item, result) in input order.
+
+    fn runs on a single background thread (one encoder call at a time) while the
+    caller consumes earlier results; at most `window` batches are read ahead and in
+    flight, so memory stays bounded however long the input is.
+    """
+    inflight: Deque[Tuple[List[T], Any]] = deque()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for batch in iter_batches(items, batch_size):
+            inflight.append((batch, pool.submit(fn, batch)))
+            if len(inflight) >= max(1, window):
+                done, fut = inflight.popleft()
+                yield from zip(done, fut.result())
+        while inflight:
+            done, fut = inflight.popleft()
+            yield from zip(done, fut.result())
+
+
+def iter_question_records(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Parses JSONL input. Each line is either {"question": ..., ...} (other fields such as
+    "id" are passed through) or a bare JSON string. Blank lines are skipped. A line that
+    is not valid JSON, or is some other JSON value, yields {"error": ...} so it keeps its
+    slot in the output instead of aborting the run.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"error": f"line {line_no}: invalid JSON ({e.msg})"}
+            continue
+        if isinstance(rec, str):
+            rec = {"question": rec}
+        elif not isinstance(rec, dict):
+            rec = {"error": f"line {line_no}: expected a JSON object or string, got {_JSON_TYPES.get(type(rec), type(rec).__name__)}"}
+        yield rec
+
+
+def question_of(rec: Dict[str, Any]) -> str:
+    """The record's question, stripped; missing or non-string questions count as empty."""
+    q = rec.get("question")
+    return q.strip() if isinstance(q, str) else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch answering: JSONL questions in, JSONL answer payloads out.")
+    parser.add_argument("--config", type=str, default=None, help="Path to config YAML (optional).")
+    parser.add_argument("--input", type=str, default="-", help="JSONL file of questions, or - for stdin.")
+    parser.add_argument("--out", type=str, default="-", help="JSONL file for answer payloads, or - for stdout.")
+    parser.add_argument("--top_k", type=int, default=5, help="Chunks to retrieve.")
+    parser.add_argument("--max_quotes", type=int, default=2, help="How many evidence quotes to include.")
+    parser.add_argument("--batch_size", type=int, default=32, help="Questions per encoder batch.")
+    parser.add_argument("--window", type=int, default=4, help="Max batches read ahead / in flight.")
+    parser.add_argument(
+        "--retrieval",
+        type=str,
+        choices=["single", "late"],
+        default="single",
+        help="single = one pooled vector per chunk; late = rerank FAISS candidates by token-level MaxSim.",
+    )
+    parser.add_argument("--candidates", type=int, default=50, help="First-stage candidates for --retrieval late.")
+    parser.add_argument(
+        "--extractive",
+        action="store_true",
+        help="Quote the best-matching sentences (needs an index built with --sentences).",
+    )
+    parser.add_argument(
+        "--cache_threshold",
+        type=float,
+        default=None,
+        help="Enable the semantic cache: reuse results for questions with cosine similarity >= this (e.g. 0.95).",
+    )
+    parser.add_argument("--cache_size", type=int, default=10000, help="Max cached questions (LRU eviction).")
+    parser.add_argument("--cache_ttl", type=float, default=None, help="Cached entries expire after this many seconds.")
+    args = parser.parse_args()
+
+    cfg = load_config(args.config)
+    repo_root = get_repo_root()
+
+    retrieval_cfg = cfg.get("retrieval", {})
+    model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
+
+    index_root = repo_root / "data" / "index"
+    index_dir = resolve_index_dir(index_root)
+    index_path = index_dir / "faiss.index"
+    meta_path = index_dir / "meta.jsonl"
+
+    # Progress goes to stderr so stdout can carry the JSONL payloads.
+    log = sys.stderr
+
+    if not index_path.exists() or not meta_path.exists():
+        print("Missing index artifacts. Run:", file=log)
+        print("  python -m src.ingest", file=log)
+        print("  python -m src.index", file=log)
+        return
+
+    model = SentenceTransformer(model_name)
+
+    def load_artifacts(build_id: Optional[str]) -> Dict[str, Any]:
+        index_dir = build_dir_for(index_root, build_id)
+        loaded: Dict[str, Any] = {
+            "build_id": build_id,
+            "meta": load_meta(index_dir / "meta.jsonl"),
+            "index": faiss.read_index(str(index_dir / "faiss.index")),
+            "sentence_store": None,
+            "token_store": None,
+        }
+        if args.extractive:
+            loaded["sentence_store"] = load_sentence_store(index_dir)
+            if loaded["sentence_store"] is None:
+                print("Index has no sentence store. Rebuild with:", file=log)
+                print("  python -m src.index --sentences", file=log)
+                return {}
+        if args.retrieval == "late":
+            loaded["token_store"] = load_token_store(index_dir)
+            if loaded["token_store"] is None:
+                print("Index has no late-interaction token store. Rebuild with:", file=log)
+                print("  python -m src.index --late_interaction", file=log)
+                return {}
+        return loaded
+
+    art = load_artifacts(current_build_id(index_root))
+    if not art:
+        return
+
+    cache = None
+    if args.cache_threshold is not None:
+        cache = SemanticCache(
+            art["index"].d,
+            threshold=args.cache_threshold,
+            max_size=args.cache_size,
+            ttl_s=args.cache_ttl,
+            build_id=art["build_id"],
+        )
+
+    def answer_records(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Pick up a newly published build between batches (hot swap) and drop stale cache entries.
+        build_id = current_build_id(index_root)
+        if build_id != art["build_id"]:
+            reloaded = load_artifacts(build_id)
+            if reloaded:
+                art.update(reloaded)
+                print(f"Reloaded index build {build_id}", file=log)
+                if cache is not None:
+                    cache.check_build(build_id)
+            else:
+                # Keep serving the loaded build; don't retry the same broken build every batch.
+                art["build_id"] = build_id
+
+        questions = [question_of(rec) for rec in batch]
+        asked = [q for q in questions if q]
+        payloads = iter(
+            answer_batch(
+                model,
+                art["index"],
+                art["meta"],
+                asked,
+                args.top_k,
+                args.max_quotes,
+                token_store=art["token_store"],
+                sentence_store=art["sentence_store"],
+                candidates=args.candidates,
+                cache=cache,
+            )
+            if asked
+            else []
+        )
+        # Empty questions and bad lines keep their slot so output lines stay aligned with input lines.
+        return [
+            next(payloads) if q else {"question": q, "error": rec.get("error", "empty question")}
+            for rec, q in zip(batch, questions)
+        ]
+
+    in_f = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out_f = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+
+    n = 0
+    t0 = time.perf_counter()
+    try:
+        records = iter_question_records(in_f)
+        for rec, payload in map_batches(records, answer_records, args.batch_size, args.window):
+            if "id" in rec:
+                payload = {"id": rec["id"], **payload}
+            out_f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            n += 1
+    finally:
+        if in_f is not sys.stdin:
+            in_f.close()
+        if out_f is not sys.stdout:
+            out_f.close()
+        else:
+            out_f.flush()
+    elapsed = time.perf_counter() - t0
+
+    qps = (n / elapsed) if elapsed > 0 else 0.0
+    print(f"Answered {n} questions in {elapsed:.2f}s ({qps:.1f} questions/s, batch_size={args.batch_size})", file=log)
+    if cache is not None:
+        st = cache.stats()
+        print(
+            f"Semantic cache: hit_rate={st['hit_rate']:.3f} ({st['hits']}/{st['lookups']}) "
+            f"threshold={st['threshold']} size={st['size']}",
+            file=log,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Sentence store artifacts, written next to faiss.index by `python -m src.index --sentences`.
+SENT_EMB_FILE = "sentences_emb.npy"  # (n_sentences, d) float16, L2-normalized
+SENT_SPANS_FILE = "sentences_spans.npy"  # (n_sentences, 2) int32 [start, end) char offsets in the chunk text
+SENT_PTR_FILE = "sentences_ptr.npy"  # (n_chunks + 1,) int64; chunk i owns rows ptr[i]:ptr[i+1]
+
+_SENT_END = re.compile(r"(?<=[.!?])\s+|\s+(?=- )")
+
+
+def split_sentences(text: str, max_chars: int = 320, min_chars: int = 3) -> List[Tuple[int, int]]:
+    """
+    Splits text into sentence spans [start, end) at sentence punctuation and "- " bullets.
+    Sentences longer than max_chars are cut into max_chars windows so every span
+    is short enough to quote.
+    """
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    bounds = [(m.start(), m.end()) for m in _SENT_END.finditer(text)] + [(len(text), len(text))]
+
+    for end, next_start in bounds:
+        # Trim surrounding whitespace without losing offsets.
+        s, e = start, end
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        while e - s > max_chars:
+            spans.append((s, s + max_chars))
+            s += max_chars
+        if e - s >= min_chars:
+            spans.append((s, e))
+        start = next_start
+
+    return spans
+
+
+def encode_sentences(model, texts: List[str], batch_size: int) -> Dict[str, np.ndarray]:
+    """
+    Sentence arrays for one batch of chunks, in the layout index checkpoint parts use:
+    sent_emb (n, d) float16, sent_spans (n, 2) int32, sent_counts (n_chunks,) int32.
+    """
+    spans_per_chunk = [split_sentences(t) for t in texts]
+    sentences = [t[s:e] for t, spans in zip(texts, spans_per_chunk) for s, e in spans]
+    counts = np.asarray([len(spans) for spans in spans_per_chunk], dtype=np.int32)
+
+    if sentences:
+        emb = np.asarray(model.encode(sentences, batch_size=batch_size, normalize_embeddings=True), dtype=np.float16)
+        spans = np.asarray([span for spans in spans_per_chunk for span in spans], dtype=np.int32)
+    else:
+        dim = model.get_sentence_embedding_dimension()
+        emb = np.zeros((0, dim), dtype=np.float16)
+        spans = np.zeros((0, 2), dtype=np.int32)
+
+    return {"sent_emb": emb, "sent_spans": spans, "sent_counts": counts}
+
+
+def load_sentence_store(index_dir: Path) -> Optional[Dict[str, np.ndarray]]:
+    """Memory-maps the sentence store for a build, or None if it was built without --sentences."""
+    paths = [index_dir / SENT_EMB_FILE, index_dir / SENT_SPANS_FILE, index_dir / SENT_PTR_FILE]
+    if not all(p.exists() for p in paths):
+        return None
+    emb, spans, ptr = (np.load(p, mmap_mode="r") for p in paths)
+    return {"emb": emb, "spans": spans, "ptr": ptr}
+
+
+def extract_quotes(
+    store: Dict[str, np.ndarray],
+    q_emb: np.ndarray,
+    hits: List[Tuple[int, float, Dict[str, Any]]],
+    max_quotes: int,
+) -> List[Dict[str, Any]]:
+    """
+    Scores every sentence of the retrieved chunks against the question embedding in
+    a single matrix-vector product and returns the best spans as quotes.
+
+    hits: (meta row index, retrieval score, meta row) as returned by search_ids().
+    Each quote carries character offsets into the cited chunk's text.
+    """
+    ptr = store["ptr"]
+    rows: List[np.ndarray] = []
+    owners: List[np.ndarray] = []
+    for h, (idx, _, _) in enumerate(hits):
+        lo, hi = int(ptr[idx]), int(ptr[idx + 1])
+        rows.append(np.arange(lo, hi))
+        owners.append(np.full(hi - lo, h))
+
+    if not rows:
+        return []
+    sent_ids = np.concatenate(rows)
+    if sent_ids.size == 0:
+        return []
+    hit_of = np.concatenate(owners)
+
+    scores = np.asarray(store["emb"][sent_ids], dtype=np.float32) @ np.asarray(q_emb, dtype=np.float32).reshape(-1)
+    best = np.argsort(-scores, kind="stable")[:max_quotes]
+
+    quotes = []
+    for b in best:
+        _, _, row = hits[int(hit_of[b])]
+        start, end = (int(x) for x in store["spans"][sent_ids[b]])
+        source_file = row.get("source_file", "unknown")
+        chunk_id = row.get("chunk_id", "unknown")
+        quotes.append(
+            {
+                "citation": f"{source_file}#{chunk_id}",
+                "quote": row.get("text", "")[start:end],
+                "start": start,
+                "end": end,
+                "score": float(scores[b]),
+            }
+        )
+    return quotes
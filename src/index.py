@@ -1,12 +1,24 @@
 import argparse
+import hashlib
 import json
+import shutil
+import time
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 
+from src.artifacts import atomic_save_npz, atomic_write_text, build_dir_for, fsync_tree, new_build_dir, publish_build
 from src.config import get_repo_root, load_config
+from src.extractive import SENT_EMB_FILE, SENT_PTR_FILE, SENT_SPANS_FILE, encode_sentences
+from src.late_interaction import compress_token_batch, encode_token_batch, train_compressor, write_token_store
+
+
+CHECKPOINT_DIR = ".checkpoint"
+COMPRESSOR_FILE = "tokens_compressor.npz"  # token residual compressor, trained once per build (--late_interaction)
+REDUCE_METHODS = ("pca", "truncate")
 
 
 def load_chunks(path: Path):
@@ -20,9 +32,359 @@ def load_chunks(path: Path):
     return chunks
 
 
+def build_fingerprint(chunks_path: Path, model_name: str, options: str = "") -> str:
+    """Identifies the inputs of a build; a checkpoint is only resumed if this matches."""
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(options.encode("utf-8"))
+    with chunks_path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_checkpoint(ckpt_dir: Path, fingerprint: str) -> Dict[str, Any]:
+    """
+    Returns checkpoint state {"fingerprint", "n_done", "parts"}.
+    A missing, unreadable or stale (different inputs) checkpoint is discarded.
+    """
+    state_path = ckpt_dir / "state.json"
+    if state_path.exists():
+        try:
+            state = json.loads(state_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            state = {}
+        if state.get("fingerprint") == fingerprint and all((ckpt_dir / p).exists() for p in state.get("parts", [])):
+            return state
+
+    if ckpt_dir.exists():
+        shutil.rmtree(ckpt_dir)
+    ckpt_dir.mkdir(parents=True)
+    return {"fingerprint": fingerprint, "n_done": 0, "parts": []}
+
+
+def save_checkpoint_part(ckpt_dir: Path, state: Dict[str, Any], start: int, arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Persists one part (the batches embedded since the last checkpoint), then advances
+    state.json. The part is written before the state that references it, so a crash
+    at any point leaves a consistent checkpoint.
+    """
+    name = f"part_{start:09d}.npz"
+    atomic_save_npz(ckpt_dir / name, **arrays)
+
+    n_rows = int(arrays["emb"].shape[0])
+    state["parts"].append(name)
+    state["n_done"] = start + n_rows
+    atomic_write_text(ckpt_dir / "state.json", json.dumps(state))
+
+
+def encode_batch(
+    model: SentenceTransformer,
+    texts: List[str],
+    batch_size: int,
+    sentences: bool = False,
+    tokens: bool = False,
+) -> Dict[str, np.ndarray]:
+    """All per-chunk arrays for one batch; every key is concatenated along axis 0 across batches."""
+    emb = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    arrays = {"emb": np.asarray(emb, dtype=np.float32)}
+    if sentences:
+        arrays.update(encode_sentences(model, texts, batch_size))
+    if tokens:
+        arrays.update(encode_token_batch(model, texts, batch_size))
+    return arrays
+
+
+def concat_arrays(batches: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {k: np.concatenate([b[k] for b in batches]) for k in batches[0]}
+
+
+def load_compressor(ckpt_dir: Path) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    path = ckpt_dir / COMPRESSOR_FILE
+    if not path.exists():
+        return None
+    with np.load(path) as f:
+        return f["centroids"], f["scale"]
+
+
+def train_token_compressor(
+    ckpt_dir: Path,
+    batches: List[Dict[str, np.ndarray]],
+    n_centroids: int,
+    max_train_tokens: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Trains the token compressor on (a strided sample of) the buffered batches and checkpoints it."""
+    tokens = np.concatenate([b["tok_emb"] for b in batches])
+    stride = max(1, len(tokens) // max_train_tokens)
+    centroids, scale = train_compressor(tokens[::stride].astype(np.float32), n_centroids)
+    atomic_save_npz(ckpt_dir / COMPRESSOR_FILE, centroids=centroids, scale=scale)
+    return centroids, scale
+
+
+def embed_with_checkpoints(
+    model: SentenceTransformer,
+    texts: List[str],
+    ckpt_dir: Path,
+    state: Dict[str, Any],
+    batch_size: int,
+    checkpoint_every: int,
+    sentences: bool = False,
+    tokens: bool = False,
+    n_centroids: int = 4096,
+    max_train_tokens: int = 200_000,
+) -> None:
+    """
+    Embeds texts[state["n_done"]:] in batches, checkpointing every `checkpoint_every` batches.
+
+    With tokens, the residual compressor is trained once the first max_train_tokens
+    tokens are buffered (or the input ends) and checkpointed; from then on every
+    batch is compressed as soon as it is encoded. Memory and checkpoint parts never
+    hold more uncompressed token embeddings than that first training sample.
+    """
+    pending: List[Dict[str, np.ndarray]] = []
+    part_start = state["n_done"]
+    compressor = load_compressor(ckpt_dir) if tokens else None
+
+    for start in range(state["n_done"], len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        pending.append(encode_batch(model, batch, batch_size, sentences=sentences, tokens=tokens))
+
+        if tokens and compressor is None:
+            n_buffered = sum(len(b["tok_emb"]) for b in pending)
+            last = start + batch_size >= len(texts)
+            if n_buffered >= max_train_tokens or last:
+                compressor = train_token_compressor(ckpt_dir, pending, n_centroids, max_train_tokens)
+        if compressor is not None:
+            pending = [compress_token_batch(b, *compressor) if "tok_emb" in b else b for b in pending]
+
+        # Parts only ever hold compressed tokens, so the first one waits for the compressor.
+        if len(pending) >= checkpoint_every and (compressor is not None or not tokens):
+            save_checkpoint_part(ckpt_dir, state, part_start, concat_arrays(pending))
+            print(f"  checkpoint: {state['n_done']}/{len(texts)} chunks embedded")
+            pending = []
+            part_start = state["n_done"]
+
+    if pending:
+        save_checkpoint_part(ckpt_dir, state, part_start, concat_arrays(pending))
+
+
+def make_index(dim: int, reduce_dim: Optional[int] = None, reduce_method: str = "pca") -> faiss.Index:
+    """
+    Inner-product index over normalized embeddings (cosine similarity).
+
+    With reduce_dim < dim, vectors are projected to reduce_dim dims (a learned PCA, or
+    "truncate": keep the leading dims, for Matryoshka-trained models) and re-normalized
+    inside the index (faiss.IndexPreTransform). The projection is saved in faiss.index
+    and applied on search(), so callers keep passing full-size query embeddings.
+    """
+    if not reduce_dim or reduce_dim >= dim:
+        return faiss.IndexFlatIP(dim)
+    if reduce_method == "pca":
+        transform = faiss.PCAMatrix(dim, reduce_dim)
+    elif reduce_method == "truncate":
+        transform = faiss.RemapDimensionsTransform(dim, reduce_dim, False)
+    else:
+        raise ValueError(f"Unknown reduce_method: {reduce_method!r} (expected one of {REDUCE_METHODS})")
+    index = faiss.IndexPreTransform(faiss.NormalizationTransform(reduce_dim, 2.0), faiss.IndexFlatIP(reduce_dim))
+    index.prepend_transform(transform)
+    return index
+
+
+def base_index_dim(index: faiss.Index) -> int:
+    """Dimension of the stored vectors (index.d is the query/input dimension)."""
+    if isinstance(index, faiss.IndexPreTransform):
+        return index.index.d
+    return index.d
+
+
+def build_index_from_parts(
+    ckpt_dir: Path,
+    state: Dict[str, Any],
+    reduce_dim: Optional[int] = None,
+    reduce_method: str = "pca",
+    max_train: int = 100_000,
+) -> faiss.Index:
+    """Builds the index from checkpointed embeddings; a PCA projection is trained on a strided sample first."""
+    with np.load(ckpt_dir / state["parts"][0]) as part:
+        dim = part["emb"].shape[1]
+    index = make_index(dim, reduce_dim, reduce_method)
+
+    if not index.is_trained:
+        stride = max(1, state["n_done"] // max_train)
+        sample = np.concatenate([part["emb"][::stride] for part in iter_parts(ckpt_dir, state, ["emb"])])
+        index.train(sample)
+        del sample
+
+    for part in iter_parts(ckpt_dir, state, ["emb"]):
+        index.add(part["emb"])
+    return index
+
+
+def write_concatenated(ckpt_dir: Path, state: Dict[str, Any], key: str, out_path: Path) -> np.ndarray:
+    """
+    Streams one array key from every checkpoint part into a single .npy at out_path
+    (via np.lib.format.open_memmap), so the full array never has to fit in RAM.
+    Returns the memmap.
+    """
+    shapes = []
+    dtype = None
+    for name in state["parts"]:
+        with np.load(ckpt_dir / name) as part:
+            shapes.append(part[key].shape)
+            dtype = part[key].dtype
+
+    total = sum(shape[0] for shape in shapes)
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=(total,) + tuple(shapes[0][1:]))
+    offset = 0
+    for name, shape in zip(state["parts"], shapes):
+        with np.load(ckpt_dir / name) as part:
+            out[offset : offset + shape[0]] = part[key]
+        offset += shape[0]
+    out.flush()
+    return out
+
+
+def write_sentence_store(ckpt_dir: Path, state: Dict[str, Any], build_dir: Path) -> int:
+    write_concatenated(ckpt_dir, state, "sent_emb", build_dir / SENT_EMB_FILE)
+    write_concatenated(ckpt_dir, state, "sent_spans", build_dir / SENT_SPANS_FILE)
+
+    counts = np.concatenate([part["sent_counts"] for part in iter_parts(ckpt_dir, state, ["sent_counts"])])
+    ptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    np.save(build_dir / SENT_PTR_FILE, ptr)
+    return int(ptr[-1])
+
+
+def iter_parts(ckpt_dir: Path, state: Dict[str, Any], keys: List[str]):
+    for name in state["parts"]:
+        with np.load(ckpt_dir / name) as part:
+            yield {k: part[k] for k in keys}
+
+
+def write_late_interaction_store(ckpt_dir: Path, state: Dict[str, Any], build_dir: Path) -> int:
+    """Copies the already-compressed token parts into the build's token store."""
+    centroids, scale = load_compressor(ckpt_dir)
+    n_tokens = 0
+    for part in iter_parts(ckpt_dir, state, ["tok_counts"]):
+        n_tokens += int(part["tok_counts"].sum())
+
+    parts = iter_parts(ckpt_dir, state, ["tok_codes", "tok_residuals", "tok_counts"])
+    write_token_store(parts, n_tokens, centroids, scale, build_dir)
+    return n_tokens
+
+
+def build_index(
+    model: SentenceTransformer,
+    model_name: str,
+    chunks_path: Path,
+    chunks: List[Dict[str, Any]],
+    index_root: Path,
+    batch_size: int = 256,
+    checkpoint_every: int = 20,
+    fresh: bool = False,
+    sentences: bool = False,
+    late_interaction: bool = False,
+    n_centroids: int = 4096,
+    reduce_dim: Optional[int] = None,
+    reduce_method: str = "pca",
+) -> Dict[str, Any]:
+    """
+    Embeds chunks (resuming from index_root/.checkpoint), writes a new build dir and
+    publishes it. Returns the build info also written to build.json.
+    Used by main() and by eval.bench, so benchmarks time the real build.
+    """
+    index_root.mkdir(parents=True, exist_ok=True)
+    ckpt_dir = index_root / CHECKPOINT_DIR
+    texts = [c["text"] for c in chunks]
+
+    options = f"sentences={sentences};tokens={late_interaction}"
+    if late_interaction:
+        options += f";n_centroids={n_centroids}"
+    fingerprint = build_fingerprint(chunks_path, model_name, options=options)
+    if fresh and ckpt_dir.exists():
+        shutil.rmtree(ckpt_dir)
+    state = load_checkpoint(ckpt_dir, fingerprint)
+    if state["n_done"]:
+        print(f"Resuming from checkpoint: {state['n_done']}/{len(texts)} chunks already embedded.")
+
+    embed_with_checkpoints(
+        model,
+        texts,
+        ckpt_dir,
+        state,
+        batch_size,
+        max(1, checkpoint_every),
+        sentences=sentences,
+        tokens=late_interaction,
+        n_centroids=n_centroids,
+    )
+
+    # Checkpoints hold full-size embeddings; reduce_dim only changes how they are indexed.
+    index = build_index_from_parts(ckpt_dir, state, reduce_dim, reduce_method)
+
+    # Write the complete pair into a fresh build dir. Nothing reads it until
+    # publish_build() swaps CURRENT, so plain writes (fsynced before publishing) are safe here.
+    build_dir = new_build_dir(index_root, time.strftime("%Y%m%dT%H%M%S") + "-" + fingerprint[:8])
+
+    faiss.write_index(index, str(build_dir / "faiss.index"))
+
+    with (build_dir / "meta.jsonl").open("w", encoding="utf-8") as f:
+        for c in chunks:
+            f.write(json.dumps(c, ensure_ascii=False) + "\n")
+
+    n_sentences = write_sentence_store(ckpt_dir, state, build_dir) if sentences else None
+    n_tokens = write_late_interaction_store(ckpt_dir, state, build_dir) if late_interaction else None
+
+    build_info = {
+        "build_id": build_dir.name,
+        "embedding_model": model_name,
+        "chunks_fingerprint": fingerprint,
+        "n_chunks": len(chunks),
+        "dim": index.d,
+        "index_dim": base_index_dim(index),
+        "reduce_method": reduce_method if base_index_dim(index) < index.d else None,
+        "n_sentences": n_sentences,
+        "n_tokens": n_tokens,
+    }
+    (build_dir / "build.json").write_text(json.dumps(build_info, indent=2), encoding="utf-8")
+
+    # The checkpoint is only dropped once the published build is durable on disk.
+    fsync_tree(build_dir)
+    publish_build(index_root, build_dir)
+    shutil.rmtree(ckpt_dir, ignore_errors=True)
+    return build_info
+
+
 def main():
     parser = argparse.ArgumentParser(description="Build a FAISS index from chunked JSONL.")
     parser.add_argument("--config", type=str, default=None, help="Path to config YAML (optional).")
+    parser.add_argument("--batch_size", type=int, default=256, help="Chunks per encoder batch.")
+    parser.add_argument("--checkpoint_every", type=int, default=20, help="Checkpoint after this many batches.")
+    parser.add_argument("--fresh", action="store_true", help="Ignore any existing checkpoint and start over.")
+    parser.add_argument(
+        "--sentences",
+        action="store_true",
+        help="Also embed each chunk's sentences (memory-mapped store used by src.answer --extractive).",
+    )
+    parser.add_argument(
+        "--late_interaction",
+        action="store_true",
+        help="Also store compressed per-token embeddings for MaxSim reranking (--retrieval late).",
+    )
+    parser.add_argument("--n_centroids", type=int, default=4096, help="Centroids for token residual compression.")
+    parser.add_argument(
+        "--reduce_dim",
+        type=int,
+        default=None,
+        help="Store chunk vectors with this many dims (smaller index, faster search). Default: full model dim.",
+    )
+    parser.add_argument(
+        "--reduce_method",
+        type=str,
+        choices=list(REDUCE_METHODS),
+        default="pca",
+        help="pca = learned projection; truncate = keep the leading dims (Matryoshka-trained models only).",
+    )
     args = parser.parse_args()
 
     cfg = load_config(args.config)
@@ -32,8 +394,7 @@ def main():
     model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
 
     chunks_path = repo_root / "data" / "processed" / "chunks.jsonl"
-    out_dir = repo_root / "data" / "index"
-    out_dir.mkdir(parents=True, exist_ok=True)
+    index_root = repo_root / "data" / "index"
 
     if not chunks_path.exists():
         print(f"Missing chunks file: {chunks_path}")
@@ -46,27 +407,48 @@ def main():
     print(f"Loaded {len(texts)} chunks.")
     print(f"Embedding model: {model_name}")
 
-    model = SentenceTransformer(model_name)
-    emb = model.encode(texts, normalize_embeddings=True)
-    emb = np.asarray(emb, dtype=np.float32)
-
-    d = emb.shape[1]
-    index = faiss.IndexFlatIP(d)  # cosine similarity via normalized vectors
-    index.add(emb)
+    if not texts:
+        print("No chunks to index.")
+        return
 
-    faiss_path = out_dir / "faiss.index"
-    faiss.write_index(index, str(faiss_path))
+    if args.reduce_dim and args.reduce_method == "pca" and len(texts) < args.reduce_dim:
+        print(f"PCA to {args.reduce_dim} dims needs at least {args.reduce_dim} chunks (have {len(texts)}).")
+        print("Use a smaller --reduce_dim or --reduce_method truncate.")
+        return
 
-    meta_path = out_dir / "meta.jsonl"
-    with meta_path.open("w", encoding="utf-8") as f:
-        for c in chunks:
-            f.write(json.dumps(c, ensure_ascii=False) + "\n")
+    model = SentenceTransformer(model_name)
+    info = build_index(
+        model,
+        model_name,
+        chunks_path,
+        chunks,
+        index_root,
+        batch_size=args.batch_size,
+        checkpoint_every=args.checkpoint_every,
+        fresh=args.fresh,
+        sentences=args.sentences,
+        late_interaction=args.late_interaction,
+        n_centroids=args.n_centroids,
+        reduce_dim=args.reduce_dim,
+        reduce_method=args.reduce_method,
+    )
+    build_dir = build_dir_for(index_root, info["build_id"])
+    faiss_path = build_dir / "faiss.index"
+    meta_path = build_dir / "meta.jsonl"
+    n_sentences, n_tokens = info["n_sentences"], info["n_tokens"]
 
     print("Index build complete.")
     print(f"Config:   {args.config or '(auto)'}")
     print(f"Chunks:   {chunks_path}")
+    print(f"Build:    {build_dir.name}")
     print(f"Index:    {faiss_path}")
+    if info["reduce_method"]:
+        print(f"Reduced:  {info['dim']} -> {info['index_dim']} dims ({info['reduce_method']})")
     print(f"Metadata: {meta_path}")
+    if n_sentences is not None:
+        print(f"Sentences: {n_sentences} ({build_dir / SENT_EMB_FILE})")
+    if n_tokens is not None:
+        print(f"Tokens:   {n_tokens} (late interaction, residual-compressed)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+# Late-interaction (ColBERT-style) token store, written next to faiss.index by
+# `python -m src.index --late_interaction`. Each token vector is stored as the id of
+# its nearest centroid plus an int8-quantized residual: x ~= centroids[code] + residual * scale.
+TOK_CENTROIDS_FILE = "tokens_centroids.npy"  # (n_centroids, d) float32
+TOK_CODES_FILE = "tokens_codes.npy"  # (n_tokens,) uint16
+TOK_RESIDUALS_FILE = "tokens_residuals.npy"  # (n_tokens, d) int8
+TOK_SCALE_FILE = "tokens_scale.npy"  # (d,) float32, per-dimension residual step
+TOK_PTR_FILE = "tokens_ptr.npy"  # (n_chunks + 1,) int64; chunk i owns rows ptr[i]:ptr[i+1]
+
+
+def _to_numpy(t) -> np.ndarray:
+    if hasattr(t, "detach"):
+        t = t.detach().float().cpu().numpy()
+    return np.asarray(t, dtype=np.float32)
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def encode_tokens(model, texts: List[str], batch_size: int) -> List[np.ndarray]:
+    """Per-text (n_tokens, d) L2-normalized token embeddings (padding removed)."""
+    out = model.encode(texts, batch_size=batch_size, output_value="token_embeddings")
+    return [normalize_rows(_to_numpy(t)) for t in out]
+
+
+def encode_token_batch(model, texts: List[str], batch_size: int) -> Dict[str, np.ndarray]:
+    """
+    Token arrays for one batch of chunks: tok_emb (n_tokens, d) float16, tok_counts (n_chunks,) int32.
+    compress_token_batch() turns them into the layout index checkpoint parts use.
+    """
+    per_text = encode_tokens(model, texts, batch_size)
+    counts = np.asarray([t.shape[0] for t in per_text], dtype=np.int32)
+    return {"tok_emb": np.concatenate(per_text).astype(np.float16), "tok_counts": counts}
+
+
+def train_compressor(sample: np.ndarray, n_centroids: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Learns (centroids, scale) from a sample of token vectors.
+    scale is chosen so int8 covers the 99.9th percentile of |residual| per dimension.
+    """
+    sample = np.ascontiguousarray(sample, dtype=np.float32)
+    k = int(max(1, min(n_centroids, sample.shape[0], np.iinfo(np.uint16).max)))
+    km = faiss.Kmeans(sample.shape[1], k, niter=20, seed=seed, spherical=True, verbose=False)
+    km.train(sample)
+    centroids = np.asarray(km.centroids, dtype=np.float32)
+
+    codes = assign_codes(centroids, sample)
+    resid = np.abs(sample - centroids[codes])
+    scale = np.percentile(resid, 99.9, axis=0).astype(np.float32) / 127.0
+    scale = np.maximum(scale, 1e-6)
+    return centroids, scale
+
+
+def assign_codes(centroids: np.ndarray, x: np.ndarray) -> np.ndarray:
+    index = faiss.IndexFlatIP(centroids.shape[1])
+    index.add(centroids)
+    _, ids = index.search(np.ascontiguousarray(x, dtype=np.float32), 1)
+    return ids[:, 0].astype(np.uint16)
+
+
+def compress(centroids: np.ndarray, scale: np.ndarray, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    x = np.asarray(x, dtype=np.float32)
+    codes = assign_codes(centroids, x)
+    resid = np.clip(np.rint((x - centroids[codes]) / scale), -127, 127).astype(np.int8)
+    return codes, resid
+
+
+def compress_token_batch(arrays: Dict[str, np.ndarray], centroids: np.ndarray, scale: np.ndarray) -> Dict[str, np.ndarray]:
+    """Replaces a batch's tok_emb with tok_codes (n_tokens,) uint16 and tok_residuals (n_tokens, d) int8."""
+    out = dict(arrays)
+    out["tok_codes"], out["tok_residuals"] = compress(centroids, scale, out.pop("tok_emb"))
+    return out
+
+
+def write_token_store(
+    parts: Iterable[Dict[str, np.ndarray]],
+    n_tokens: int,
+    centroids: np.ndarray,
+    scale: np.ndarray,
+    out_dir: Path,
+) -> None:
+    """Streams compressed token parts (tok_codes, tok_residuals, tok_counts) into memory-mappable .npy files."""
+    d = centroids.shape[1]
+    codes_out = np.lib.format.open_memmap(out_dir / TOK_CODES_FILE, mode="w+", dtype=np.uint16, shape=(n_tokens,))
+    resid_out = np.lib.format.open_memmap(out_dir / TOK_RESIDUALS_FILE, mode="w+", dtype=np.int8, shape=(n_tokens, d))
+
+    counts = []
+    offset = 0
+    for part in parts:
+        n = len(part["tok_codes"])
+        codes_out[offset : offset + n] = part["tok_codes"]
+        resid_out[offset : offset + n] = part["tok_residuals"]
+        offset += n
+        counts.append(part["tok_counts"])
+    codes_out.flush()
+    resid_out.flush()
+
+    counts = np.concatenate(counts)
+    ptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+
+    np.save(out_dir / TOK_CENTROIDS_FILE, centroids)
+    np.save(out_dir / TOK_SCALE_FILE, scale)
+    np.save(out_dir / TOK_PTR_FILE, ptr)
+
+
+def load_token_store(index_dir: Path) -> Optional[Dict[str, np.ndarray]]:
+    """Memory-maps the token store for a build, or None if it was built without --late_interaction."""
+    names = {
+        "centroids": TOK_CENTROIDS_FILE,
+        "codes": TOK_CODES_FILE,
+        "residuals": TOK_RESIDUALS_FILE,
+        "scale": TOK_SCALE_FILE,
+        "ptr": TOK_PTR_FILE,
+    }
+    if not all((index_dir / f).exists() for f in names.values()):
+        return None
+    store = {k: np.load(index_dir / f, mmap_mode="r") for k, f in names.items()}
+    # Small arrays are read fully; codes/residuals stay memory-mapped.
+    store["centroids"] = np.asarray(store["centroids"])
+    store["scale"] = np.asarray(store["scale"])
+    return store
+
+
+def decompress(store: Dict[str, np.ndarray], rows: np.ndarray) -> np.ndarray:
+    x = store["centroids"][store["codes"][rows]] + store["residuals"][rows].astype(np.float32) * store["scale"]
+    return normalize_rows(x)
+
+
+def maxsim_scores(store: Dict[str, np.ndarray], q_tok: np.ndarray, chunk_ids: List[int]) -> np.ndarray:
+    """
+    MaxSim for every candidate at once: one (m, N) similarity matrix over the query
+    tokens and all candidate tokens, a segmented max per candidate, then a sum over
+    query tokens. Candidates without tokens score -inf.
+    """
+    ptr = store["ptr"]
+    lo = np.asarray([ptr[i] for i in chunk_ids], dtype=np.int64)
+    hi = np.asarray([ptr[i + 1] for i in chunk_ids], dtype=np.int64)
+    lengths = hi - lo
+
+    scores = np.full(len(chunk_ids), -np.inf, dtype=np.float32)
+    present = lengths > 0
+    if not present.any():
+        return scores
+
+    rows = np.concatenate([np.arange(a, b) for a, b in zip(lo[present], hi[present])])
+    sim = np.asarray(q_tok, dtype=np.float32) @ decompress(store, rows).T  # (m, N)
+    starts = np.concatenate([[0], np.cumsum(lengths[present])[:-1]])
+    scores[present] = np.maximum.reduceat(sim, starts, axis=1).sum(axis=0)
+    return scores
+
+
+def rerank(
+    store: Dict[str, np.ndarray],
+    q_tok: np.ndarray,
+    hits: List[Tuple[int, float, Dict[str, Any]]],
+) -> List[Tuple[int, float, Dict[str, Any]]]:
+    """
+    Reorders first-stage hits (meta row index, score, row) by MaxSim; the score becomes
+    the MaxSim score. Hits whose chunk has no tokens cannot be scored and are dropped,
+    so every returned score is finite (and JSON-serializable).
+    """
+    if not hits:
+        return []
+    scores = maxsim_scores(store, q_tok, [idx for idx, _, _ in hits])
+    order = np.argsort(-scores, kind="stable")
+    return [(hits[i][0], float(scores[i]), hits[i][2]) for i in order if np.isfinite(scores[i])]
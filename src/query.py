@@ -7,6 +7,7 @@ import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from src.artifacts import resolve_index_dir
 from src.config import get_repo_root, load_config
 
 
@@ -64,8 +65,9 @@ def main():
     retrieval_cfg = cfg.get("retrieval", {})
     model_name = retrieval_cfg.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2")
 
-    index_path = repo_root / "data" / "index" / "faiss.index"
-    meta_path = repo_root / "data" / "index" / "meta.jsonl"
+    index_dir = resolve_index_dir(repo_root / "data" / "index")
+    index_path = index_dir / "faiss.index"
+    meta_path = index_dir / "meta.jsonl"
 
     if not index_path.exists() or not meta_path.exists():
         print("Missing index artifacts.")
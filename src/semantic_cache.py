@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over past question embeddings.
+
+    A question whose embedding has cosine similarity >= threshold with a cached
+    question reuses that question's retrieval result (meta row ids and scores)
+    instead of searching the index again. Entries are evicted least-recently-used
+    beyond max_size, expire after ttl_s seconds (if set), and are all dropped when
+    the index build changes (see check_build()).
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        threshold: float = 0.95,
+        max_size: int = 10_000,
+        ttl_s: Optional[float] = None,
+        build_id: Optional[str] = None,
+    ):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.build_id = build_id
+        self.lookups = 0
+        self.hits = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def check_build(self, build_id: Optional[str]) -> bool:
+        """Clears the cache if the index build changed. Returns True if it was cleared."""
+        if build_id == self.build_id:
+            return False
+        self.build_id = build_id
+        self._reset()
+        return True
+
+    def _remove(self, entry_id: int) -> None:
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_s is not None and now - entry["created"] > self.ttl_s
+
+    def lookup(self, q_emb: np.ndarray, top_k: int, probe: int = 4) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached result of the most similar live entry above the threshold
+        that holds at least top_k hits, or None on a miss.
+        """
+        self.lookups += 1
+        if not self._entries:
+            return None
+
+        now = time.monotonic()
+        q = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+        sims, ids = self._index.search(q, min(probe, len(self._entries)))
+
+        for sim, entry_id in zip(sims[0], ids[0]):
+            entry_id = int(entry_id)
+            if entry_id < 0 or sim < self.threshold:
+                break
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue
+            if self._expired(entry, now):
+                self._remove(entry_id)
+                continue
+            if entry["top_k"] < top_k:
+                continue
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return {"similarity": float(sim), **entry["result"]}
+
+        return None
+
+    def insert(self, q_emb: np.ndarray, top_k: int, result: Dict[str, List[Tuple[int, float]]]) -> None:
+        """result maps names (e.g. "hits") to [(meta row index, score)] lists."""
+        entry_id = self._next_id
+        self._next_id += 1
+        self._index.add_with_ids(
+            np.asarray(q_emb, dtype=np.float32).reshape(1, -1), np.asarray([entry_id], dtype=np.int64)
+        )
+        self._entries[entry_id] = {"top_k": top_k, "created": time.monotonic(), "result": result}
+
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": (self.hits / self.lookups) if self.lookups else 0.0,
+            "size": len(self._entries),
+        }
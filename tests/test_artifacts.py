@@ -0,0 +1,41 @@
+import os
+
+from src import artifacts
+from src.artifacts import atomic_write_text, current_build_id, fsync_tree, new_build_dir, publish_build, resolve_index_dir
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    target = tmp_path / "state.json"
+    atomic_write_text(target, "one")
+    atomic_write_text(target, "two")
+    assert target.read_text(encoding="utf-8") == "two"
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
+
+
+def test_publish_build_swaps_current_and_prunes(tmp_path):
+    # Legacy flat layout until something is published.
+    assert resolve_index_dir(tmp_path) == tmp_path
+
+    dirs = [new_build_dir(tmp_path, f"2026010{i}T000000-abc") for i in range(1, 5)]
+    for d in dirs:
+        publish_build(tmp_path, d, keep=2)
+        assert current_build_id(tmp_path) == d.name
+        assert resolve_index_dir(tmp_path) == d
+
+    remaining = sorted(p.name for p in (tmp_path / "builds").iterdir())
+    assert remaining == [dirs[2].name, dirs[3].name]
+
+
+def test_fsync_tree_flushes_files_before_their_directories(tmp_path, monkeypatch):
+    build = new_build_dir(tmp_path, "20260101T000000-abc")
+    (build / "faiss.index").write_bytes(b"x")
+    (build / "sub").mkdir()
+    (build / "sub" / "tokens.npy").write_bytes(b"y")
+
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (synced.append("file"), real_fsync(fd)))
+    monkeypatch.setattr(artifacts, "_fsync_dir", lambda p: synced.append(p.name))
+    fsync_tree(build)
+
+    assert synced == ["file", "sub", "file", build.name]
@@ -0,0 +1,43 @@
+import time
+
+from src.batch import iter_question_records, map_batches, question_of
+
+
+def test_map_batches_preserves_order_and_bounds_read_ahead():
+    consumed = []
+
+    def source():
+        for i in range(20):
+            consumed.append(i)
+            yield i
+
+    def slow_square(batch):
+        time.sleep(0.001 * (len(batch) % 3))
+        return [x * x for x in batch]
+
+    out = []
+    for item, result in map_batches(source(), slow_square, batch_size=3, window=2):
+        # Never more than `window` batches pulled from the input ahead of the consumer.
+        assert len(consumed) - len(out) <= 2 * 3
+        out.append((item, result))
+
+    assert out == [(i, i * i) for i in range(20)]
+
+
+def test_iter_question_records_accepts_objects_and_strings():
+    lines = ['{"id": "a", "question": "Q1"}', "", '"Q2"']
+    assert list(iter_question_records(lines)) == [{"id": "a", "question": "Q1"}, {"question": "Q2"}]
+
+
+def test_bad_lines_become_error_records_and_non_string_questions_are_empty():
+    lines = ['{"question": "Q1"', "5", "[1, 2]", "null", '{"id": "b", "question": null}']
+    recs = list(iter_question_records(lines))
+
+    assert recs[0]["error"].startswith("line 1: invalid JSON")
+    assert [r["error"] for r in recs[1:4]] == [
+        "line 2: expected a JSON object or string, got number",
+        "line 3: expected a JSON object or string, got array",
+        "line 4: expected a JSON object or string, got null",
+    ]
+    assert recs[4] == {"id": "b", "question": None}
+    assert [question_of(r) for r in recs] == [""] * 5
@@ -0,0 +1,56 @@
+from eval.bench import SyntheticEncoder, run_isolated, write_synthetic_corpus
+from eval.diff_bench import compare_runs, parse_thresholds
+from src.ingest import ingest_raw_texts
+
+
+def test_synthetic_corpus_hits_requested_size(tmp_path):
+    write_synthetic_corpus(tmp_path / "raw", n_chunks=137, chunk_size=200, chunk_overlap=50, chunks_per_doc=20)
+    total = ingest_raw_texts(tmp_path / "raw", tmp_path / "chunks.jsonl", chunk_size=200, chunk_overlap=50)
+    assert total == 137
+
+
+def test_synthetic_encoder_is_deterministic_and_normalized():
+    enc = SyntheticEncoder(dim=16)
+    a = enc.encode(["alpha", "beta"])
+    b = enc.encode(["alpha"])
+    assert a.shape == (2, 16)
+    assert (a[0] == b[0]).all()
+    assert abs(float((a[1] ** 2).sum()) - 1.0) < 1e-5
+
+
+def test_run_one_goes_through_published_build(tmp_path):
+    # Own process, as main() runs every size, so peak RSS and cold start are this run's alone.
+    run = run_isolated(
+        work_dir=tmp_path,
+        n_chunks=80,
+        encoder_kind="synthetic",
+        model_name="synthetic",
+        dim=16,
+        chunk_size=200,
+        chunk_overlap=50,
+        n_queries=5,
+        top_k=3,
+        batch_size=32,
+        retrieval="late",
+        candidates=10,
+        n_centroids=8,
+        reduce_dim=8,
+        cache_threshold=0.99,
+    )
+    assert (tmp_path / "index" / "CURRENT").exists()
+    assert not (tmp_path / "index" / ".checkpoint").exists()
+    assert run["n_chunks"] == 80 and run["query_n"] == 5
+    assert run["build_size_bytes"] > run["index_size_bytes"]  # token store lives next to faiss.index
+    assert run["cache_hit_rate"] == 0.0
+    assert run["cold_start_s"] > 0
+
+
+def test_compare_runs_flags_regressions_by_direction():
+    thresholds = parse_thresholds(["query_p99_ms=0.5"], default=0.1)
+    baseline = {"query_p50_ms": 10.0, "query_p99_ms": 20.0, "batch_qps": 100.0}
+    current = {"query_p50_ms": 12.0, "query_p99_ms": 28.0, "batch_qps": 95.0}
+
+    rows = {r["metric"]: r for r in compare_runs(baseline, current, thresholds)}
+    assert rows["query_p50_ms"]["regression"]  # +20% > 10%
+    assert not rows["query_p99_ms"]["regression"]  # +40% < 50%
+    assert not rows["batch_qps"]["regression"]  # -5% throughput < 10%
@@ -0,0 +1,34 @@
+import numpy as np
+
+from src.extractive import extract_quotes, split_sentences
+
+
+def test_split_sentences_offsets_and_bullets():
+    text = "Core principles: - Auditability - Reproducibility. It cites sources! Done?"
+    spans = split_sentences(text)
+    parts = [text[s:e] for s, e in spans]
+    assert parts == ["Core principles:", "- Auditability", "- Reproducibility.", "It cites sources!", "Done?"]
+
+
+def test_split_sentences_caps_long_runs():
+    text = "x" * 700
+    spans = split_sentences(text, max_chars=320)
+    assert [e - s for s, e in spans] == [320, 320, 60]
+
+
+def test_extract_quotes_picks_best_sentence_across_chunks():
+    rows = [
+        {"source_file": "a.txt", "chunk_id": "a_0", "text": "Alpha one. Beta two."},
+        {"source_file": "b.txt", "chunk_id": "b_0", "text": "Gamma three."},
+    ]
+    store = {
+        "emb": np.asarray([[1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float16),
+        "spans": np.asarray([[0, 10], [11, 20], [0, 12]], dtype=np.int32),
+        "ptr": np.asarray([0, 2, 3], dtype=np.int64),
+    }
+    hits = [(1, 0.9, rows[1]), (0, 0.5, rows[0])]
+    q_emb = np.asarray([0.1, 0.9, 0.2], dtype=np.float32)
+
+    quotes = extract_quotes(store, q_emb, hits, max_quotes=2)
+    assert [(q["citation"], q["quote"]) for q in quotes] == [("a.txt#a_0", "Beta two."), ("b.txt#b_0", "Gamma three.")]
+    assert (quotes[0]["start"], quotes[0]["end"]) == (11, 20)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from src.index import COMPRESSOR_FILE, build_index_from_parts, embed_with_checkpoints, load_checkpoint, write_late_interaction_store
+from src.late_interaction import load_token_store, maxsim_scores, normalize_rows
+
+
+class FlakyModel:
+    """Encodes text "i" as [i, 1]; raises once `fail_after` batches have been encoded."""
+
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.fail_after = fail_after
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True):
+        if self.fail_after is not None and self.calls >= self.fail_after:
+            raise RuntimeError("simulated crash")
+        self.calls += 1
+        return np.asarray([[float(t), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_build_resumes_from_last_checkpoint(tmp_path):
+    texts = [str(i) for i in range(10)]
+    ckpt = tmp_path / ".checkpoint"
+
+    state = load_checkpoint(ckpt, "fp")
+    with pytest.raises(RuntimeError):
+        embed_with_checkpoints(FlakyModel(fail_after=3), texts, ckpt, state, batch_size=2, checkpoint_every=2)
+
+    # Two batches were checkpointed; the third was lost with the crash.
+    state = load_checkpoint(ckpt, "fp")
+    assert state["n_done"] == 4
+
+    model = FlakyModel()
+    embed_with_checkpoints(model, texts, ckpt, state, batch_size=2, checkpoint_every=2)
+    assert model.calls == 3
+    assert state["n_done"] == 10
+
+    index = build_index_from_parts(ckpt, state)
+    assert index.ntotal == 10
+
+
+def test_checkpoint_discarded_when_inputs_change(tmp_path):
+    ckpt = tmp_path / ".checkpoint"
+    state = load_checkpoint(ckpt, "fp-old")
+    embed_with_checkpoints(FlakyModel(), ["1", "2"], ckpt, state, batch_size=1, checkpoint_every=1)
+
+    state = load_checkpoint(ckpt, "fp-new")
+    assert state["n_done"] == 0
+    assert state["parts"] == []
+
+
+class TokenModel(FlakyModel):
+    """Adds token embeddings: text "i" has (i % 3) + 2 tokens near 4 shared directions, seeded by i."""
+
+    CENTERS = normalize_rows(np.random.default_rng(99).standard_normal((4, 8)).astype(np.float32))
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, output_value=None):
+        if output_value != "token_embeddings":
+            return super().encode(texts, batch_size=batch_size, normalize_embeddings=normalize_embeddings)
+        return [self.tokens(t) for t in texts]
+
+    @staticmethod
+    def tokens(t):
+        rng = np.random.default_rng(int(t))
+        n = int(t) % 3 + 2
+        centers = TokenModel.CENTERS[rng.integers(4, size=n)]
+        return normalize_rows(centers + 0.1 * rng.standard_normal((n, 8)).astype(np.float32))
+
+
+def test_token_parts_are_checkpointed_compressed(tmp_path):
+    texts = [str(i) for i in range(60)]
+    ckpt = tmp_path / ".checkpoint"
+    opts = dict(batch_size=4, checkpoint_every=2, tokens=True, n_centroids=4, max_train_tokens=100)
+
+    state = load_checkpoint(ckpt, "fp")
+    with pytest.raises(RuntimeError):
+        embed_with_checkpoints(TokenModel(fail_after=11), texts, ckpt, state, **opts)
+    # The first part waited until the compressor had ~100 tokens to train on.
+    assert (ckpt / COMPRESSOR_FILE).exists()
+    assert state["parts"][0] == "part_000000000.npz" and state["n_done"] == 44
+    with np.load(ckpt / state["parts"][0]) as part:
+        assert "tok_emb" not in part.files
+        assert part["tok_residuals"].dtype == np.int8
+
+    state = load_checkpoint(ckpt, "fp")
+    embed_with_checkpoints(TokenModel(), texts, ckpt, state, **opts)
+    build_dir = tmp_path / "build"
+    build_dir.mkdir()
+    assert write_late_interaction_store(ckpt, state, build_dir) == sum(int(t) % 3 + 2 for t in texts)
+
+    store = load_token_store(build_dir)
+    q_tok = TokenModel.tokens("5")
+    want = [float((q_tok @ TokenModel.tokens(t).T).max(axis=1).sum()) for t in texts]
+    assert np.allclose(maxsim_scores(store, q_tok, list(range(len(texts)))), want, atol=0.05)
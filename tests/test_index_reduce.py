@@ -0,0 +1,68 @@
+import faiss
+import numpy as np
+
+from eval.dim_sweep import sweep_dims
+from src.index import base_index_dim, build_index_from_parts, load_checkpoint, make_index, save_checkpoint_part
+
+
+def unit_rows(x):
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def low_rank_embeddings(n, dim, rank, seed=0):
+    """Normalized vectors whose variance lives in `rank` directions (plus a little noise)."""
+    rng = np.random.default_rng(seed)
+    basis = np.linalg.qr(rng.standard_normal((dim, rank)))[0].T
+    return unit_rows(rng.standard_normal((n, rank)) @ basis + 0.01 * rng.standard_normal((n, dim)))
+
+
+def test_pca_index_round_trips_and_takes_full_dim_queries(tmp_path):
+    emb = low_rank_embeddings(300, 32, rank=6)
+    ckpt = tmp_path / ".checkpoint"
+    state = load_checkpoint(ckpt, "fp")
+    save_checkpoint_part(ckpt, state, 0, {"emb": emb[:150]})
+    save_checkpoint_part(ckpt, state, 150, {"emb": emb[150:]})
+
+    index = build_index_from_parts(ckpt, state, reduce_dim=8, reduce_method="pca")
+    assert (index.d, base_index_dim(index), index.ntotal) == (32, 8, 300)
+
+    # The projection is part of faiss.index, so a reloaded index still searches with full-size queries.
+    path = tmp_path / "faiss.index"
+    faiss.write_index(index, str(path))
+    loaded = faiss.read_index(str(path))
+    scores, ids = loaded.search(emb[:20], 1)
+    assert (ids[:, 0] == np.arange(20)).all()
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-4)
+
+
+def test_truncate_keeps_leading_dims_renormalized():
+    emb = unit_rows(np.random.default_rng(1).standard_normal((50, 16)))
+    index = make_index(16, 4, "truncate")
+    assert index.is_trained
+    index.add(emb)
+
+    q = emb[:3]
+    scores, ids = index.search(q, 50)
+    lead = unit_rows(emb[:, :4])
+    want = unit_rows(q[:, :4]) @ lead.T
+    got = np.take_along_axis(want, ids, axis=1)
+    assert np.allclose(scores, got, atol=1e-5)
+
+
+def test_full_dim_or_larger_is_a_plain_flat_index():
+    assert isinstance(make_index(16), faiss.IndexFlatIP)
+    assert isinstance(make_index(16, 16, "pca"), faiss.IndexFlatIP)
+
+
+def test_sweep_reports_every_variant():
+    emb = low_rank_embeddings(100, 32, rank=4, seed=2)
+    meta = [{"source_file": "doc.txt", "chunk_id": f"c{i}"} for i in range(100)]
+    expected = [[f"doc.txt#c{i}"] for i in range(10)] + [[]]
+
+    runs = sweep_dims(emb, meta, emb[:11], expected, dims=[8, 200], methods=["pca", "truncate"], top_k=1)
+
+    assert [(r["dim"], r["method"]) for r in runs] == [(32, None), (8, "pca"), (8, "truncate")]
+    full, pca, _ = runs
+    assert full["hit_at_k"] == {"value": 1.0, "hits": 10, "scored_total": 10}
+    assert pca["hit_at_k"]["value"] == 1.0
+    assert pca["index_size_bytes"] < full["index_size_bytes"]
@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.late_interaction import compress_token_batch, load_token_store, maxsim_scores, normalize_rows, rerank, train_compressor, write_token_store
+
+
+def make_store(tmp_path, per_chunk, n_centroids=8):
+    tokens = np.concatenate(per_chunk)
+    centroids, scale = train_compressor(tokens, n_centroids)
+    part = {
+        "tok_emb": tokens.astype(np.float16),
+        "tok_counts": np.asarray([len(t) for t in per_chunk], dtype=np.int32),
+    }
+    write_token_store([compress_token_batch(part, centroids, scale)], len(tokens), centroids, scale, tmp_path)
+    return load_token_store(tmp_path)
+
+
+def test_maxsim_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    per_chunk = [normalize_rows(rng.standard_normal((n, 16)).astype(np.float32)) for n in (5, 9, 3, 7)]
+    store = make_store(tmp_path, per_chunk)
+    q_tok = normalize_rows(rng.standard_normal((4, 16)).astype(np.float32))
+
+    got = maxsim_scores(store, q_tok, [2, 0, 3])
+    want = [float((q_tok @ per_chunk[i].T).max(axis=1).sum()) for i in (2, 0, 3)]
+    # Residual compression is lossy, but only slightly.
+    assert np.allclose(got, want, atol=0.05)
+
+
+def test_rerank_orders_by_maxsim_and_drops_empty_chunks(tmp_path):
+    target = normalize_rows(np.asarray([[1.0, 0.0, 0.0, 0.0]], dtype=np.float32))
+    other = normalize_rows(np.asarray([[0.0, 1.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.0]], dtype=np.float32))
+    empty = np.zeros((0, 4), dtype=np.float32)
+    store = make_store(tmp_path, [other, empty, target], n_centroids=2)
+
+    hits = [(0, 0.9, {"chunk_id": "a"}), (1, 0.8, {"chunk_id": "b"}), (2, 0.1, {"chunk_id": "c"})]
+    ranked = rerank(store, target, hits)
+    assert [row["chunk_id"] for _, _, row in ranked] == ["c", "a"]
+    assert all(np.isfinite(score) for _, score, _ in ranked)
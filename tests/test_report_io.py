@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pytest
+
+from eval.diff_results import load_report
+from eval.report_io import (
+    add_latency,
+    hist_summary,
+    iter_examples,
+    iter_sorted_examples,
+    merge_join,
+    new_latency_hist,
+    prepare_resume,
+    read_summary,
+    resume_report,
+    skip_done,
+)
+
+
+def write_lines(path, records, tail=""):
+    with path.open("w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+        f.write(tail)
+
+
+def test_prepare_resume_drops_torn_line_and_summary(tmp_path):
+    path = tmp_path / "run.jsonl"
+    records = [{"type": "example", "id": "e1"}, {"type": "example", "id": "e2"}]
+    write_lines(path, records, tail='{"type": "example", "id": "e3", "hit')
+
+    assert prepare_resume(path) == (2, None)
+    assert [r["id"] for r in iter_examples(path)] == ["e1", "e2"]
+
+    write_lines(path, records + [{"type": "summary", "total": 2}])
+    assert prepare_resume(path) == (2, None)
+    assert read_summary(path) == {}
+
+
+def test_resume_skips_by_position_including_examples_without_id(tmp_path):
+    path = tmp_path / "run.jsonl"
+    write_lines(path, [{"type": "example", "id": ""}, {"type": "example", "id": "e2"}])
+    eval_set = [{"question": "a"}, {"id": "e2", "question": "b"}, {"question": "c"}]
+
+    rest = skip_done(iter(eval_set), path, prepare_resume(path)[0])
+    assert list(rest) == [{"question": "c"}]
+
+    with pytest.raises(ValueError):
+        skip_done(iter([{"id": "other", "question": "a"}, *eval_set[1:]]), path, 2)
+
+
+def test_resume_with_missing_report_starts_from_the_beginning(tmp_path):
+    path = tmp_path / "run.jsonl"
+    eval_set = [{"id": "e1", "question": "a"}, {"id": "e2", "question": "b"}]
+
+    rest, totals, prev = resume_report(path, iter(eval_set), {"top_k": 5})
+    assert list(rest) == eval_set
+    assert (totals["total"], prev) == (0, None)
+    assert not path.exists()
+
+
+def test_resume_keeps_settings_and_refuses_different_ones(tmp_path):
+    path = tmp_path / "run.jsonl"
+    settings = {"retrieval": "single", "top_k": 5, "cache_threshold": None}
+    records = [
+        {"type": "settings", "settings": settings},
+        {"type": "example", "id": "e1", "hit_at_k": True},
+        {"type": "summary", "total": 1, "settings": settings},
+    ]
+    eval_set = [{"id": "e1", "question": "a"}, {"id": "e2", "question": "b"}]
+
+    write_lines(path, records)
+    with pytest.raises(ValueError, match="retrieval: single -> late"):
+        resume_report(path, iter(eval_set), {**settings, "retrieval": "late"})
+    assert read_summary(path)["total"] == 1
+
+    rest, totals, prev = resume_report(path, iter(eval_set), settings)
+    assert (list(rest), totals["total"], totals["hits"], prev) == (eval_set[1:], 1, 1, settings)
+    assert prepare_resume(path) == (1, settings)
+
+
+def test_unfinished_report_summary_is_rebuilt_from_examples(tmp_path, capsys):
+    path = tmp_path / "run.jsonl"
+    write_lines(
+        path,
+        [
+            {"type": "example", "id": "e1", "hit_at_k": True, "grounded_at_k": True, "correct_citations_at_k": True},
+            {"type": "example", "id": "e2", "hit_at_k": False, "grounded_at_k": None, "correct_citations_at_k": False},
+        ],
+        tail='{"type": "example", "id": "e3", "hit',
+    )
+
+    summary = load_report(path)["summary"]
+    assert summary["total"] == 2
+    assert summary["hit_at_k"]["value"] == 0.5
+    assert "no summary record" in capsys.readouterr().out
+
+
+def test_latency_histogram_percentiles_are_close_to_exact():
+    latencies = np.random.default_rng(0).lognormal(mean=1.0, sigma=1.0, size=5000)
+    hist = new_latency_hist()
+    for ms in latencies:
+        add_latency(hist, float(ms))
+
+    got = hist_summary(hist)
+    for q in (50, 99):
+        assert abs(got[f"p{q}"] / np.percentile(latencies, q) - 1.0) < 0.03
+    assert np.isclose(got["mean"], latencies.mean())
+
+
+def test_iter_sorted_examples_external_sort(tmp_path):
+    path = tmp_path / "run.jsonl"
+    ids = ["e9", "e3", "e10", "e1", "", "e5", "e2"]
+    write_lines(path, [{"type": "example", "id": i} for i in ids] + [{"type": "summary"}])
+
+    out = [r["id"] for r in iter_sorted_examples(path, run_size=2)]
+    assert out == sorted(i for i in ids if i)
+
+
+def test_merge_join_outer_join():
+    before = iter([{"id": "a", "v": 1}, {"id": "b", "v": 1}, {"id": "d", "v": 1}])
+    after = iter([{"id": "b", "v": 2}, {"id": "c", "v": 2}, {"id": "d", "v": 2}])
+
+    rows = [(i, b and b["v"], a and a["v"]) for i, b, a in merge_join(before, after)]
+    assert rows == [("a", 1, None), ("b", 1, 2), ("c", None, 2), ("d", 1, 2)]
@@ -0,0 +1,41 @@
+import numpy as np
+
+from src.semantic_cache import SemanticCache
+
+
+def unit(*xs):
+    v = np.asarray(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_lookup_respects_threshold_and_top_k():
+    cache = SemanticCache(dim=3, threshold=0.9)
+    cache.insert(unit(1, 0, 0), top_k=5, result={"hits": [(7, 0.8)]})
+
+    assert cache.lookup(unit(1, 0.1, 0), top_k=5)["hits"] == [(7, 0.8)]
+    assert cache.lookup(unit(1, 1, 0), top_k=5) is None  # cos ~0.71 < 0.9
+    assert cache.lookup(unit(1, 0, 0), top_k=10) is None  # cached result is too short
+    assert cache.stats()["hits"] == 1 and cache.stats()["lookups"] == 3
+
+
+def test_lru_eviction_and_build_invalidation():
+    cache = SemanticCache(dim=3, threshold=0.99, max_size=2, build_id="b1")
+    cache.insert(unit(1, 0, 0), 5, {"hits": [(1, 1.0)]})
+    cache.insert(unit(0, 1, 0), 5, {"hits": [(2, 1.0)]})
+    assert cache.lookup(unit(1, 0, 0), 5) is not None  # touch -> most recently used
+    cache.insert(unit(0, 0, 1), 5, {"hits": [(3, 1.0)]})
+
+    assert len(cache) == 2
+    assert cache.lookup(unit(0, 1, 0), 5) is None  # evicted as least recently used
+    assert cache.lookup(unit(1, 0, 0), 5) is not None
+
+    assert not cache.check_build("b1")
+    assert cache.check_build("b2")
+    assert len(cache) == 0 and cache.lookup(unit(1, 0, 0), 5) is None
+
+
+def test_expired_entries_are_dropped():
+    cache = SemanticCache(dim=3, threshold=0.9, ttl_s=-1.0)
+    cache.insert(unit(1, 0, 0), 5, {"hits": [(1, 1.0)]})
+    assert cache.lookup(unit(1, 0, 0), 5) is None
+    assert len(cache) == 0